@@ -0,0 +1,235 @@
+import ctypes
+import gc
+import os
+import resource
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+MB = 1024 * 1024
+
+# Hệ số đo thực tế (pandas dtype=str + python-docx/lxml), xem estimate_job_memory
+READ_BYTES_PER_CELL = 100
+RENDER_BYTES_PER_CELL = 2600
+JOB_BASE_BYTES = 50 * MB
+# RSS của 1 worker rảnh (đã import pandas/openpyxl/python-docx), đo ~86MB
+WORKER_BASE_BYTES = 100 * MB
+
+
+class AdmissionError(Exception):
+    """Job không được nhận: vượt quá ngân sách bộ nhớ hoặc hàng đợi đã đầy."""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def job_cells(
+    total_rows: int,
+    total_cols: int,
+    num_columns: int,
+    header_row: int,
+    data_start_row: int,
+    data_end_row: Optional[int] = None,
+) -> tuple[int, int]:
+    """
+    (số ô pd.read_excel phải đọc, số ô được render) của 1 job convert.
+    Dùng chung cho estimate_job_memory và scheduler.estimate_job_cost.
+    """
+    last_row = min(data_end_row, total_rows) if data_end_row else total_rows
+    selected_rows = max(last_row - data_start_row + 1, 0)
+    read_cells = max(total_rows - header_row + 1, 0) * max(total_cols, 1)
+    return read_cells, selected_rows * num_columns
+
+
+def estimate_job_memory(
+    total_rows: int,
+    total_cols: int,
+    num_columns: int,
+    header_row: int,
+    data_start_row: int,
+    data_end_row: Optional[int] = None,
+) -> int:
+    """
+    Ước lượng RAM đỉnh (bytes) của 1 job convert.
+    pd.read_excel giữ toàn bộ sheet dạng str (~100B/ô), còn cây XML của
+    python-docx tốn ~2.5KB cho mỗi ô được xuất (nhãn đậm + giá trị).
+    Không gồm RSS nền của worker (WORKER_BASE_BYTES).
+    """
+    read_cells, render_cells = job_cells(
+        total_rows, total_cols, num_columns, header_row, data_start_row, data_end_row
+    )
+    return JOB_BASE_BYTES + read_cells * READ_BYTES_PER_CELL + render_cells * RENDER_BYTES_PER_CELL
+
+
+class MemoryBudget:
+    """Quỹ bộ nhớ chung: job phải giữ chỗ (reserve) trước khi chạy và trả lại khi xong."""
+
+    def __init__(self, total_bytes: int) -> None:
+        self.total_bytes = total_bytes
+        self.reserved_bytes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def fits(self, nbytes: int) -> bool:
+        return nbytes <= self.total_bytes
+
+    def try_reserve(self, nbytes: int) -> bool:
+        with self._lock:
+            if self.reserved_bytes + nbytes > self.total_bytes:
+                return False
+            self.reserved_bytes += nbytes
+            return True
+
+    def release(self, nbytes: int) -> None:
+        with self._lock:
+            self.reserved_bytes = max(self.reserved_bytes - nbytes, 0)
+
+    def stats(self) -> dict:
+        return {
+            "total_mb": round(self.total_bytes / MB, 1),
+            "reserved_mb": round(self.reserved_bytes / MB, 1),
+            "available_mb": round((self.total_bytes - self.reserved_bytes) / MB, 1),
+            "rejected": self.rejected,
+        }
+
+
+def current_rss() -> int:
+    """RSS hiện tại của process (bytes). Linux: /proc, nơi khác: RSS đỉnh."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _release_memory() -> None:
+    """Trả heap đã free về OS: glibc giữ lại vùng nhớ sau job lớn nên RSS worker không tự giảm."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _call_and_measure(func: Callable):
+    try:
+        result = func()
+    finally:
+        _release_memory()
+    return result, current_rss()
+
+
+class ConversionWorkerPool(Executor):
+    """
+    Process pool cho job convert, tự thay worker để chống phình RSS
+    (phân mảnh heap của pandas/lxml):
+    - mỗi worker chạy tối đa max_tasks_per_child job rồi được tạo lại
+    - worker chết giữa chừng (OOM kill) => thay cả pool, chỉ job đang chạy trên nó lỗi
+    - worker nào báo RSS > rss_limit_bytes sau job => thay cả pool; job
+      đang chạy/chờ trên pool cũ vẫn hoàn tất rồi pool cũ mới tắt (tắt sớm thì
+      ProcessPoolExecutor không tạo lại worker hết lượt và job còn lại bị treo)
+    """
+
+    def __init__(self, max_workers: int, max_tasks_per_child: int = 20, rss_limit_bytes: int = 700 * MB) -> None:
+        self.max_workers = max_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.rss_limit_bytes = rss_limit_bytes
+        self.recycled = 0
+        self.last_worker_rss = 0
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+        self._in_flight: dict[ProcessPoolExecutor, int] = {}
+
+    @property
+    def resident_bytes(self) -> int:
+        """RAM các worker chiếm sẵn kể cả khi rảnh, cần trừ khỏi quỹ bộ nhớ của job."""
+        return self.max_workers * WORKER_BASE_BYTES
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+
+    def _swap(self, old: ProcessPoolExecutor) -> bool:
+        """Gọi khi đang giữ _lock. Trả về True nếu pool cũ không còn job và tắt được ngay."""
+        if self._executor is not old:
+            return False
+        self._executor = self._new_executor()
+        self.recycled += 1
+        return not self._in_flight.get(old)
+
+    def _recycle(self, old: ProcessPoolExecutor) -> None:
+        with self._lock:
+            idle = self._swap(old)
+        if idle:
+            old.shutdown(wait=False)
+
+    def _finish(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            self._in_flight[executor] -= 1
+            retired = not self._in_flight[executor] and executor is not self._executor
+            if not self._in_flight[executor]:
+                del self._in_flight[executor]
+        if retired:
+            executor.shutdown(wait=False)
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        if args or kwargs:
+            raise TypeError("ConversionWorkerPool.submit chỉ nhận callable không tham số (dùng functools.partial)")
+
+        outer: Future = Future()
+        # Giữ lock khi submit: _recycle không thể tắt pool cũ giữa lúc lấy executor và submit
+        broken = None
+        with self._lock:
+            executor = self._executor
+            try:
+                inner = executor.submit(_call_and_measure, fn)
+            except BrokenProcessPool:
+                # Worker chết (vd. bị OOM kill) và _done chưa kịp thay pool
+                broken = executor if self._swap(executor) else None
+                executor = self._executor
+                inner = executor.submit(_call_and_measure, fn)
+            self._in_flight[executor] = self._in_flight.get(executor, 0) + 1
+        if broken is not None:
+            broken.shutdown(wait=False)
+
+        def _done(f: Future) -> None:
+            try:
+                result, rss = f.result()
+            except BrokenProcessPool as e:
+                # Pool hỏng thì mọi lần submit sau đều lỗi => thay pool mới, chỉ job này thất bại
+                self._recycle(executor)
+                self._finish(executor)
+                outer.set_exception(e)
+                return
+            except BaseException as e:
+                self._finish(executor)
+                outer.set_exception(e)
+                return
+            self.last_worker_rss = rss
+            if rss > self.rss_limit_bytes:
+                self._recycle(executor)
+            self._finish(executor)
+            outer.set_result(result)
+
+        inner.add_done_callback(_done)
+        return outer
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            executors = {self._executor, *self._in_flight}
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_tasks_per_child": self.max_tasks_per_child,
+            "rss_limit_mb": round(self.rss_limit_bytes / MB, 1),
+            "resident_mb": round(self.resident_bytes / MB, 1),
+            "last_worker_rss_mb": round(self.last_worker_rss / MB, 1),
+            "recycled": self.recycled,
+        }
@@ -0,0 +1,231 @@
+"""
+Convert hàng loạt Excel -> DOCX không cần qua HTTP.
+
+Ví dụ:
+    python batch_convert.py data/ --spec spec.json -o outputs/batch -j 4
+    python batch_convert.py "data/**/*.xlsx" --sheet Sheet1 --columns "Tên,Email,3" --header-row 2 --data-start-row 3
+
+spec.json (mọi khóa đều có thể ghi đè bằng tham số dòng lệnh):
+    {
+        "sheet": "Sheet1",              // tên sheet hoặc số thứ tự (bắt đầu từ 1)
+        "columns": ["Tên", "Email", 5], // tên cột hoặc số thứ tự cột (bắt đầu từ 1)
+        "header_row": 2,
+        "data_start_row": 3,
+        "data_end_row": null,
+        "filters": [{"column": "Phòng ban", "op": "equals", "value": "Kế toán"}],  // tùy chọn
+        "sort_by": {"column": "Tên", "descending": false}                         // tùy chọn
+    }
+
+Chạy lại lệnh sau khi bị ngắt sẽ bỏ qua các file đã có output (trừ khi dùng --overwrite).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from excel_processor import (
+    ExcelProcessorError,
+    convert_excel_to_docx,
+    get_column_headers,
+    get_sheet_names,
+    validate_filter,
+)
+
+SPEC_KEYS = ("sheet", "columns", "header_row", "data_start_row", "data_end_row", "filters", "sort_by")
+
+
+def load_spec(args: argparse.Namespace) -> dict:
+    spec = {"sheet": 1, "header_row": 1, "data_end_row": None}
+    if args.spec:
+        with open(args.spec, "r", encoding="utf-8") as f:
+            spec.update(json.load(f))
+
+    if args.sheet is not None:
+        spec["sheet"] = args.sheet
+    if args.columns is not None:
+        spec["columns"] = [c.strip() for c in args.columns.split(",") if c.strip()]
+    if args.header_row is not None:
+        spec["header_row"] = args.header_row
+    if args.data_start_row is not None:
+        spec["data_start_row"] = args.data_start_row
+    if args.data_end_row is not None:
+        spec["data_end_row"] = args.data_end_row
+
+    spec.setdefault("data_start_row", spec["header_row"] + 1)
+    if not spec.get("columns"):
+        raise SystemExit("Chưa chọn cột để xuất (--columns hoặc \"columns\" trong spec)")
+    unknown = set(spec) - set(SPEC_KEYS)
+    if unknown:
+        raise SystemExit(f"Khóa không hợp lệ trong spec: {', '.join(sorted(unknown))}")
+    try:
+        for f in spec.get("filters") or []:
+            validate_filter(f)
+    except ExcelProcessorError as e:
+        raise SystemExit(str(e))
+    return spec
+
+
+def find_inputs(patterns: list[str]) -> list[tuple[str, str]]:
+    """Trả về [(đường dẫn file, đường dẫn tương đối dùng cho output)]."""
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            base = pattern
+            paths = glob.glob(os.path.join(pattern, "**", "*.xlsx"), recursive=True)
+        else:
+            paths = glob.glob(pattern, recursive=True)
+            base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) if paths else ""
+
+        for path in paths:
+            name = os.path.basename(path)
+            if name.startswith("~$") or not os.path.isfile(path):
+                continue  # file khóa tạm của Excel
+            found.setdefault(os.path.abspath(path), os.path.relpath(os.path.abspath(path), os.path.abspath(base)))
+
+    # Mỗi input tính đường dẫn tương đối theo gốc riêng => in/a/x.xlsx và in/b/x.xlsx
+    # cùng ra out/x.docx (và ghi đè nhau qua cùng file .part)
+    by_output: dict[str, list[str]] = {}
+    for path, rel_path in found.items():
+        by_output.setdefault(os.path.normcase(os.path.splitext(rel_path)[0]), []).append(path)
+    clashes = [sorted(paths) for paths in by_output.values() if len(paths) > 1]
+    if clashes:
+        lines = "\n".join("  " + " | ".join(paths) for paths in sorted(clashes))
+        raise SystemExit(f"Các file sau sẽ ghi ra cùng một output, hãy chạy riêng từng thư mục:\n{lines}")
+    return sorted(found.items())
+
+
+def _as_index(value) -> int | None:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def resolve_sheet(file_path: str, sheet) -> str:
+    names = get_sheet_names(file_path)
+    if sheet in names:
+        return sheet
+    index = _as_index(sheet)
+    if index is not None and 1 <= index <= len(names):
+        return names[index - 1]
+    raise ExcelProcessorError(f"Sheet '{sheet}' không tồn tại")
+
+
+def resolve_columns(file_path: str, sheet_name: str, header_row: int, columns: list) -> list[str]:
+    headers = get_column_headers(file_path, sheet_name, header_row)
+    resolved = []
+    for col in columns:
+        if col in headers:
+            resolved.append(col)
+            continue
+        index = _as_index(col)
+        if index is None or not 1 <= index <= len(headers):
+            raise ExcelProcessorError(f"Không tìm thấy cột: {col}")
+        resolved.append(headers[index - 1])
+    return resolved
+
+
+def convert_one(input_path: str, output_path: str, spec: dict) -> int:
+    sheet_name = resolve_sheet(input_path, spec["sheet"])
+    columns = resolve_columns(input_path, sheet_name, spec["header_row"], spec["columns"])
+
+    # Ghi ra file tạm rồi đổi tên => file .docx chỉ tồn tại khi đã convert xong (để resume)
+    tmp_path = output_path + ".part"
+    try:
+        rows = convert_excel_to_docx(
+            input_path,
+            tmp_path,
+            sheet_name,
+            columns,
+            spec["header_row"],
+            spec["data_start_row"],
+            spec["data_end_row"],
+            filters=spec.get("filters"),
+            sort_by=spec.get("sort_by"),
+        )
+        os.replace(tmp_path, output_path)
+        return rows
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _print_progress(done: int, total: int, failed: int, rows: int, started: float) -> None:
+    elapsed = max(time.monotonic() - started, 1e-9)
+    sys.stderr.write(
+        f"\r[{done}/{total}] lỗi: {failed} | {done / elapsed:.2f} file/s | {rows / elapsed:.0f} dòng/s"
+    )
+    sys.stderr.flush()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert hàng loạt Excel sang DOCX")
+    parser.add_argument("inputs", nargs="+", help="Thư mục (quét đệ quy *.xlsx) hoặc glob, vd: 'data/**/*.xlsx'")
+    parser.add_argument("-o", "--output-dir", default="outputs/batch", help="Thư mục output (giữ cấu trúc thư mục con)")
+    parser.add_argument("--spec", help="File JSON cấu hình sheet/cột/dòng")
+    parser.add_argument("--sheet", help="Tên sheet hoặc số thứ tự (bắt đầu từ 1)")
+    parser.add_argument("--columns", help="Danh sách cột cách nhau bởi dấu phẩy, tên hoặc số thứ tự")
+    parser.add_argument("--header-row", type=int)
+    parser.add_argument("--data-start-row", type=int)
+    parser.add_argument("--data-end-row", type=int)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Số process song song")
+    parser.add_argument("--overwrite", action="store_true", help="Convert lại cả file đã có output")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args)
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("Không tìm thấy file .xlsx nào", file=sys.stderr)
+        return 1
+
+    tasks = []
+    skipped = 0
+    for input_path, rel_path in inputs:
+        output_path = os.path.join(args.output_dir, os.path.splitext(rel_path)[0] + ".docx")
+        if not args.overwrite and os.path.exists(output_path):
+            skipped += 1
+            continue
+        tasks.append((input_path, output_path))
+
+    print(f"Tìm thấy {len(inputs)} file, bỏ qua {skipped} file đã convert, cần xử lý {len(tasks)} file", file=sys.stderr)
+
+    started = time.monotonic()
+    done = failed = total_rows = 0
+    errors = []
+
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+        futures = {executor.submit(convert_one, inp, out, spec): inp for inp, out in tasks}
+        try:
+            for future in as_completed(futures):
+                done += 1
+                try:
+                    total_rows += future.result()
+                except Exception as e:
+                    failed += 1
+                    errors.append((futures[future], str(e)))
+                _print_progress(done, len(tasks), failed, total_rows, started)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            print("\nĐã dừng. Chạy lại lệnh để tiếp tục các file còn lại.", file=sys.stderr)
+            return 130
+
+    elapsed = time.monotonic() - started
+    if tasks:
+        sys.stderr.write("\n")
+    for path, message in errors:
+        print(f"✗ {path}: {message}", file=sys.stderr)
+
+    print(
+        f"Hoàn tất: {done - failed}/{len(tasks)} file, {total_rows} bản ghi, "
+        f"{elapsed:.1f}s ({(done - failed) / max(elapsed, 1e-9):.2f} file/s, "
+        f"{total_rows / max(elapsed, 1e-9):.0f} bản ghi/s), bỏ qua {skipped}, lỗi {failed}"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
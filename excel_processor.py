@@ -1,9 +1,20 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
 from docx.shared import Pt
+from lxml import etree
 from openpyxl import load_workbook
 
+# python-docx chèn mỗi paragraph trước sectPr bằng cách quét body => body càng lớn càng chậm
+# (O(n^2)). Render từng khối nhỏ trong document tạm rồi ghép lại giữ chi phí tuyến tính.
+RENDER_CHUNK_ROWS = int(os.getenv("RENDER_CHUNK_ROWS", 500))
+# Render song song: chỉ dùng process pool khi số bản ghi đủ lớn để bù chi phí spawn process
+PARALLEL_MIN_ROWS = int(os.getenv("PARALLEL_MIN_ROWS", 2000))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 1))
+
 class ExcelProcessorError(Exception):
     pass
 
@@ -36,6 +47,29 @@ def get_sheet_names(file_path: str) -> list[str]:
     except Exception as e:
         raise ExcelProcessorError(f"Không thể đọc file Excel: {str(e)}")
 
+def get_sheet_dimensions(file_path: str, sheet_name: str) -> tuple[int, int]:
+    """
+    (số dòng, số cột) theo thẻ <dimension> của sheet, không đọc dữ liệu
+    (trừ khi sheet thiếu thẻ này). Dùng để ước lượng chi phí/RAM của job trước khi convert.
+    """
+    validate_excel_file(file_path)
+    try:
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        if sheet_name not in wb.sheetnames:
+            wb.close()
+            raise ExcelProcessorError(f"Sheet '{sheet_name}' không tồn tại")
+        ws = wb[sheet_name]
+        if ws.max_row is None or ws.max_column is None:
+            # File do công cụ khác tạo có thể thiếu <dimension> => duyệt sheet (streaming) để đếm
+            ws.calculate_dimension(force=True)
+        dims = (ws.max_row or 0, ws.max_column or 0)
+        wb.close()
+        return dims
+    except ExcelProcessorError:
+        raise
+    except Exception as e:
+        raise ExcelProcessorError(f"Không thể đọc file Excel: {str(e)}")
+
 def preview_sheet_data(file_path: str, sheet_name: str, num_rows: int = 10) -> dict:
     """
     Preview = quét TOÀN BỘ sheet, lấy N dòng CÓ DỮ LIỆU đầu tiên.
@@ -126,12 +160,24 @@ def convert_excel_to_docx(
     header_row: int,
     data_start_row: int,
     data_end_row: int | None = None,
+    workers: int | None = None,
+    filters: list[dict] | None = None,
+    sort_by: dict | None = None,
 ) -> int:
+    """
+    filters: [{"column", "op": equals|contains|in|range, "value" | "values" | "min"/"max"}]
+    sort_by: {"column", "descending": bool}
+    Lọc/sắp xếp sau khi ffill (để giữ đúng nhóm ô merge) và trước khi render,
+    dòng không khớp sẽ không được ghi vào DOCX.
+    """
     validate_excel_file(excel_file_path)
 
     if not selected_columns:
         raise ExcelProcessorError("Chưa chọn cột để xuất")
 
+    for f in filters or []:
+        validate_filter(f)
+
     if data_start_row <= header_row:
         raise ExcelProcessorError("Dòng data phải > dòng header")
 
@@ -153,8 +199,13 @@ def convert_excel_to_docx(
         .str.strip()
     )
     
+    # Cột dùng để lọc/sắp xếp cũng cần ffill, kể cả khi không xuất ra DOCX
+    filters = filters or []
+    extra_columns = [f["column"] for f in filters] + ([sort_by["column"]] if sort_by else [])
+    used_columns = list(dict.fromkeys(list(selected_columns) + extra_columns))
+
     # Kiểm tra cột
-    missing = [c for c in selected_columns if c not in df.columns]
+    missing = [c for c in used_columns if c not in df.columns]
     if missing:
         raise ExcelProcessorError(f"Không tìm thấy các cột sau: {', '.join(missing)}")
 
@@ -167,7 +218,7 @@ def convert_excel_to_docx(
 
     df_subset = df.iloc[start_idx:end_idx].copy()
     
-    df_final = df_subset[selected_columns].reset_index(drop=True)
+    df_final = df_subset[used_columns].reset_index(drop=True)
     
     df_final = df_final.fillna("")
 
@@ -178,24 +229,30 @@ def convert_excel_to_docx(
     if df_final.empty:
         raise ExcelProcessorError("Không có dữ liệu nào trong khoảng dòng đã chọn")
 
+    if filters:
+        df_final = df_final[_filter_mask(df_final, filters)]
+        if df_final.empty:
+            raise ExcelProcessorError("Không có bản ghi nào khớp điều kiện lọc")
+
+    if sort_by:
+        df_final = _sort_rows(df_final, sort_by["column"], bool(sort_by.get("descending")))
+
+    df_final = df_final[selected_columns].reset_index(drop=True)
+
     try:
-        doc = Document()
-        style = doc.styles["Normal"]
-        style.font.name = "Arial"
-        style.font.size = Pt(11)
+        doc = _new_document()
 
         total_rows = len(df_final)
-        for i, row in df_final.iterrows():
-            p = doc.add_paragraph()
-            for col in selected_columns:
-                val = str(row[col]).strip()
-                
-                run_header = p.add_run(f"{col}: ")
-                run_header.bold = True
-                p.add_run(f"{val}\n")
-            
-            if i < total_rows - 1:
-                doc.add_paragraph("-" * 50)
+        rows = df_final.values.tolist()
+
+        if workers is None:
+            workers = RENDER_WORKERS
+        workers = max(1, min(workers, total_rows // max(PARALLEL_MIN_ROWS, 1)))
+
+        if workers <= 1:
+            _render_rows_chunked(doc, rows, selected_columns)
+        else:
+            _render_rows_parallel(doc, rows, selected_columns, workers)
 
         os.makedirs(os.path.dirname(output_docx_path), exist_ok=True)
         doc.save(output_docx_path)
@@ -203,4 +260,173 @@ def convert_excel_to_docx(
         return total_rows
 
     except Exception as e:
-        raise ExcelProcessorError(f"Lỗi khi ghi file DOCX: {str(e)}")
\ No newline at end of file
+        raise ExcelProcessorError(f"Lỗi khi ghi file DOCX: {str(e)}")
+
+def _as_number(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series.str.strip().replace("", pd.NA), errors="coerce")
+
+def _as_date(series: pd.Series) -> pd.Series:
+    """Ô ngày của Excel đọc bằng dtype=str có dạng ISO; chuỗi gõ tay thì theo kiểu dd/mm/yyyy."""
+    series = series.str.strip().replace("", pd.NA)
+    dates = pd.to_datetime(series, errors="coerce", format="ISO8601")
+    rest = dates.isna() & series.notna()
+    if rest.any():
+        dates[rest] = pd.to_datetime(series[rest], errors="coerce", dayfirst=True, format="mixed")
+    return dates
+
+def _parse_date_bound(value, column: str):
+    if value is None:
+        return None
+    parsed = _as_date(pd.Series([str(value)])).iloc[0]
+    if pd.isna(parsed):
+        raise ExcelProcessorError(f"Mốc ngày không hợp lệ ở cột '{column}': {value}")
+    return parsed
+
+def validate_filter(f: dict) -> None:
+    """
+    Kiểm tra 1 điều kiện lọc mà không cần đọc file: toán tử, equals/contains có value,
+    in có ít nhất 1 giá trị, range có ít nhất 1 mốc, min/max cùng là số hoặc cùng là ngày,
+    mốc ngày parse được.
+    """
+    column, op = f["column"], f.get("op", "equals")
+    if op not in ("equals", "contains", "in", "range"):
+        raise ExcelProcessorError(f"Toán tử lọc không hợp lệ: {op}")
+    if op in ("equals", "contains"):
+        # Thiếu value thì equals không khớp dòng nào, contains "" lại khớp mọi dòng
+        if f.get("value") is None or not str(f["value"]).strip():
+            raise ExcelProcessorError(f"Điều kiện {op} của cột '{column}' cần value")
+        return
+    if op == "in":
+        if not f.get("values"):
+            raise ExcelProcessorError(f"Điều kiện in của cột '{column}' cần ít nhất 1 giá trị trong values")
+        return
+
+    bounds = [b for b in (f.get("min"), f.get("max")) if b is not None]
+    if not bounds:
+        raise ExcelProcessorError(f"Điều kiện range của cột '{column}' cần min hoặc max")
+    if any(isinstance(b, bool) for b in bounds):
+        raise ExcelProcessorError(f"Điều kiện range của cột '{column}': min/max phải là số hoặc ngày")
+    numeric = [isinstance(b, (int, float)) for b in bounds]
+    if any(numeric) and not all(numeric):
+        raise ExcelProcessorError(
+            f"Điều kiện range của cột '{column}': min và max phải cùng là số hoặc cùng là ngày"
+        )
+    if not any(numeric):
+        for bound in bounds:
+            _parse_date_bound(bound, column)
+
+def _filter_mask(df: pd.DataFrame, filters: list[dict]) -> pd.Series:
+    """AND tất cả điều kiện, tính vector hóa trên cả cột."""
+    mask = pd.Series(True, index=df.index)
+    for f in filters:
+        column, op = f["column"], f.get("op", "equals")
+        values = df[column].astype(str).str.strip()
+
+        if op == "equals":
+            mask &= values == str(f.get("value", "")).strip()
+        elif op == "contains":
+            needle = str(f.get("value", "")).strip().casefold()
+            mask &= values.str.casefold().str.contains(needle, regex=False)
+        elif op == "in":
+            mask &= values.isin([str(v).strip() for v in f.get("values") or []])
+        elif op == "range":
+            low, high = f.get("min"), f.get("max")
+            bounds = [b for b in (low, high) if b is not None]
+            if all(isinstance(b, (int, float)) for b in bounds):
+                converted = _as_number(values)
+            else:
+                # Mốc dạng chuỗi => so sánh theo ngày
+                converted = _as_date(values)
+                low = _parse_date_bound(low, column)
+                high = _parse_date_bound(high, column)
+            in_range = converted.notna()
+            if low is not None:
+                in_range &= converted >= low
+            if high is not None:
+                in_range &= converted <= high
+            mask &= in_range.fillna(False).astype(bool)
+    return mask
+
+def _sort_rows(df: pd.DataFrame, column: str, descending: bool) -> pd.DataFrame:
+    """
+    Sắp xếp ổn định theo 1 cột: theo số nếu mọi ô có dữ liệu đều là số,
+    rồi đến ngày, còn lại theo chuỗi. Ô trống luôn nằm cuối.
+    """
+    values = df[column].astype(str).str.strip()
+    non_empty = values != ""
+
+    key = _as_number(values)
+    if key[non_empty].isna().any():
+        key = _as_date(values)
+        if key[non_empty].isna().any():
+            key = values.str.casefold().where(non_empty)
+
+    order = key.sort_values(ascending=not descending, kind="mergesort", na_position="last").index
+    return df.loc[order]
+
+def _new_document():
+    doc = Document()
+    style = doc.styles["Normal"]
+    style.font.name = "Arial"
+    style.font.size = Pt(11)
+    return doc
+
+def _render_rows(doc, rows: list, selected_columns: list[str], offset: int, total_rows: int) -> None:
+    """
+    Ghi các bản ghi vào doc. offset = chỉ số toàn cục của dòng đầu tiên,
+    dùng để biết khi nào KHÔNG thêm dòng phân cách (bản ghi cuối cùng).
+    """
+    for i, row in enumerate(rows, start=offset):
+        p = doc.add_paragraph()
+        for col, value in zip(selected_columns, row):
+            val = str(value).strip()
+
+            run_header = p.add_run(f"{col}: ")
+            run_header.bold = True
+            p.add_run(f"{val}\n")
+
+        if i < total_rows - 1:
+            doc.add_paragraph("-" * 50)
+
+def _render_chunk(rows: list, selected_columns: list[str], offset: int, total_rows: int) -> list:
+    """Render một khối dòng liên tiếp vào document tạm, trả về các phần tử <w:body> (bỏ sectPr)."""
+    doc = _new_document()
+    _render_rows(doc, rows, selected_columns, offset, total_rows)
+    return [el for el in doc.element.body if el.tag != qn("w:sectPr")]
+
+def _chunks(rows: list, selected_columns: list[str], chunk_rows: int) -> list[tuple]:
+    total_rows = len(rows)
+    chunk_rows = max(chunk_rows, 1)
+    return [
+        (rows[start:start + chunk_rows], selected_columns, start, total_rows)
+        for start in range(0, total_rows, chunk_rows)
+    ]
+
+def _append_body(doc, elements) -> None:
+    """Thêm phần tử vào cuối body của doc, trước sectPr (O(1) mỗi phần tử)."""
+    body = doc.element.body
+    sect_pr = body.find(qn("w:sectPr"))
+    for element in elements:
+        if sect_pr is not None:
+            sect_pr.addprevious(element)
+        else:
+            body.append(element)
+
+def _render_rows_chunked(doc, rows: list, selected_columns: list[str], chunk_rows: int | None = None) -> None:
+    for task in _chunks(rows, selected_columns, chunk_rows or RENDER_CHUNK_ROWS):
+        _append_body(doc, _render_chunk(*task))
+
+def _render_fragment(args: tuple) -> list[bytes]:
+    """Chạy trong worker process: như _render_chunk nhưng trả về XML đã serialize."""
+    return [etree.tostring(el) for el in _render_chunk(*args)]
+
+def _render_rows_parallel(doc, rows: list, selected_columns: list[str], workers: int) -> None:
+    """
+    Các khối RENDER_CHUNK_ROWS dòng được render ở worker process rồi ghép
+    lại đúng thứ tự vào body của doc (trước sectPr).
+    Style (Arial 11) nằm ở styles.xml của doc cha nên các fragment dùng chung.
+    Chỉ có lợi khi máy có nhiều CPU; trên 1 CPU chậm hơn bản chunked tuần tự.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for fragment in executor.map(_render_fragment, _chunks(rows, selected_columns, RENDER_CHUNK_ROWS)):
+            _append_body(doc, (parse_xml(xml) for xml in fragment))
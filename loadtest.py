@@ -0,0 +1,359 @@
+"""
+Load test: mô phỏng nhiều user chạy đúng luồng UI
+upload -> preview -> get-columns -> convert -> download.
+
+Chạy trong cùng process với app (ASGI, không cần server):
+    python loadtest.py --users 10 --duration 60
+
+Chạy vào uvicorn đang chạy (cùng máy):
+    python loadtest.py --base-url http://localhost:8080 --server-pid 12345 \\
+        --session-db sessions/sessions.db     # server dùng SESSION_BACKEND=sqlite
+
+Kết quả lưu ở loadtest_results/<thời điểm>.json, so sánh với lần chạy trước:
+    python loadtest.py --compare loadtest_results/20240114_153045.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+from openpyxl import Workbook
+
+from session_store import SQLiteSessionBackend, issue_session_cookie
+
+ENDPOINTS = ("upload", "preview", "get-columns", "convert", "download")
+DEFAULT_MIX = "small:200x6:6,medium:2000x12:3,large:10000x20:1"
+
+
+# ---------- Workbook tổng hợp ----------
+
+def parse_mix(spec: str) -> list[tuple[str, int, int, int]]:
+    """"tên:dòngxcột:trọng_số,..." -> [(tên, dòng, cột, trọng số)]"""
+    mix = []
+    for item in spec.split(","):
+        name, size, weight = item.split(":")
+        rows, cols = size.lower().split("x")
+        mix.append((name, int(rows), int(cols), int(weight)))
+    return mix
+
+
+def generate_workbook(path: str, rows: int, cols: int, seed: int = 0) -> None:
+    """
+    Sheet "Data": dòng 1 tiêu đề, dòng 2 header, data từ dòng 3.
+    Cột đầu có ô trống xen kẽ để mô phỏng ô merge (ffill).
+    """
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Data")
+    ws.append(["Báo cáo tổng hợp"])
+    ws.append(["Phòng ban"] + [f"Cột {j}" for j in range(2, cols + 1)])
+    for i in range(rows):
+        group = f"Phòng {i // 5}" if i % 5 == 0 else None
+        ws.append([group] + [f"Giá trị {i}-{j} {rnd.randint(0, 10**6)}" for j in range(2, cols + 1)])
+    wb.save(path)
+
+
+def build_workbooks(mix: list, folder: str) -> list[tuple[str, str, int, int, int]]:
+    books = []
+    for name, rows, cols, weight in mix:
+        path = os.path.join(folder, f"loadtest_{name}_{rows}x{cols}.xlsx")
+        if not os.path.exists(path):
+            generate_workbook(path, rows, cols)
+        books.append((name, path, rows, cols, weight))
+    return books
+
+
+# ---------- Đo đạc ----------
+
+def tree_rss(pid: int) -> int:
+    """
+    RSS (bytes) của process pid và toàn bộ process con cháu (Linux /proc).
+    Tìm con theo ppid trong /proc/*/stat: worker do thread quản lý của executor
+    tạo lại không nằm trong /proc/<pid>/task/<pid>/children.
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children: dict[int, list[int]] = {}
+    rss: dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Tên process có thể chứa dấu cách/ngoặc => cắt sau ")" cuối
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        # fields[1] = ppid, fields[21] = rss (số trang)
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss[int(entry)] = int(fields[21]) * page_size
+
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.error_messages: dict[str, int] = {}
+        self.rss: list[tuple[float, int]] = []
+
+    def add(self, endpoint: str, seconds: float, ok: bool, message: str = "") -> None:
+        self.samples[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+            key = f"{endpoint}: {message[:120]}"
+            self.error_messages[key] = self.error_messages.get(key, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name in ENDPOINTS:
+            values = sorted(self.samples[name])
+            count = len(values)
+            endpoints[name] = {
+                "requests": count,
+                "errors": self.errors[name],
+                "error_rate": round(self.errors[name] / count, 4) if count else 0.0,
+                "throughput_rps": round(count / elapsed, 3) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+            }
+        return {
+            "endpoints": endpoints,
+            "errors": self.error_messages,
+            "rss_mb": [(round(t, 1), round(v / 1024 / 1024, 1)) for t, v in self.rss],
+            "peak_rss_mb": round(max((v for _, v in self.rss), default=0) / 1024 / 1024, 1),
+        }
+
+
+# ---------- Virtual user ----------
+
+async def call(recorder: Recorder, endpoint: str, request):
+    started = time.perf_counter()
+    try:
+        response = await request
+    except Exception as e:
+        recorder.add(endpoint, time.perf_counter() - started, False, repr(e))
+        return None
+    ok = response.status_code < 400
+    message = "" if ok else f"{response.status_code} {response.text}"
+    recorder.add(endpoint, time.perf_counter() - started, ok, message)
+    return response if ok else None
+
+
+async def run_flow(client: httpx.AsyncClient, recorder: Recorder, book: tuple, think: tuple[float, float]) -> None:
+    name, path, rows, cols, _ = book
+
+    async def pause():
+        await asyncio.sleep(random.uniform(*think))
+
+    with open(path, "rb") as f:
+        content = f.read()
+    files = {"file": (os.path.basename(path), content, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+    r = await call(recorder, "upload", client.post("/upload", files=files))
+    if r is None:
+        return
+    filename = r.json()["filename"]
+    await pause()
+
+    r = await call(recorder, "preview", client.post("/preview", json={"filename": filename, "sheet": "Data", "num_rows": 10}))
+    if r is None:
+        return
+    await pause()
+
+    r = await call(recorder, "get-columns", client.post("/get-columns", json={"filename": filename, "sheet": "Data", "header_row": 2}))
+    if r is None:
+        return
+    columns = r.json()["columns"]
+    await pause()
+
+    selected = random.sample(columns, k=max(1, min(len(columns), random.randint(2, 8))))
+    r = await call(recorder, "convert", client.post("/convert", json={
+        "filename": filename,
+        "sheet": "Data",
+        "columns": selected,
+        "header_row": 2,
+        "data_start_row": 3,
+        "data_end_row": None,
+    }))
+    if r is None:
+        return
+    output_file = r.json()["output_file"]
+    await pause()
+
+    await call(recorder, "download", client.get(f"/download/{output_file}"))
+
+
+async def virtual_user(index: int, client: httpx.AsyncClient, recorder: Recorder, books: list,
+                       think: tuple[float, float], deadline: float, iterations: int | None) -> None:
+    weights = [b[4] for b in books]
+    done = 0
+    while time.monotonic() < deadline and (iterations is None or done < iterations):
+        book = random.choices(books, weights=weights)[0]
+        await run_flow(client, recorder, book, think)
+        done += 1
+
+
+async def sample_rss(recorder: Recorder, pid: int, started: float, interval: float) -> None:
+    while True:
+        recorder.rss.append((time.monotonic() - started, tree_rss(pid)))
+        await asyncio.sleep(interval)
+
+
+# ---------- Main ----------
+
+def make_clients(args: argparse.Namespace, num_users: int):
+    """Trả về (danh sách client theo user, pid server để đo RSS, hàm dọn dẹp)."""
+    users = [{"sub": f"loadtest-{i}", "email": f"loadtest-{i}@example.com", "name": f"Load test {i}"} for i in range(num_users)]
+    timeout = httpx.Timeout(args.timeout)
+
+    if args.base_url:
+        if args.session_db:
+            backend = SQLiteSessionBackend(args.session_db, ttl=3600)
+            cookies = [issue_session_cookie(backend, os.getenv("SECRET_KEY", "change-this-secret"), {"user": u}) for u in users]
+        else:
+            cookies = [args.session_cookie] * num_users
+        clients = [
+            httpx.AsyncClient(base_url=args.base_url, timeout=timeout, cookies={"session": c} if c else None)
+            for c in cookies
+        ]
+        return clients, args.server_pid, lambda: None
+
+    # In-process: thư mục upload/output tạm, session tạo thẳng vào backend của app
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(workdir, "uploads"))
+    os.environ.setdefault("OUTPUT_FOLDER", os.path.join(workdir, "outputs"))
+    os.makedirs(os.environ["UPLOAD_FOLDER"], exist_ok=True)
+    os.makedirs(os.environ["OUTPUT_FOLDER"], exist_ok=True)
+
+    import main as app_module
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    clients = []
+    for u in users:
+        cookie = issue_session_cookie(app_module.session_backend, app_module.SECRET_KEY, {"user": u})
+        clients.append(httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout,
+                                         cookies={"session": cookie}))
+
+    def cleanup():
+        app_module.conversion_scheduler.executor.shutdown(wait=False, cancel_futures=True)
+
+    return clients, os.getpid(), cleanup
+
+
+async def run(args: argparse.Namespace) -> dict:
+    mix = parse_mix(args.mix)
+    os.makedirs(args.workbook_dir, exist_ok=True)
+    print(f"Tạo workbook mẫu trong {args.workbook_dir} ...", file=sys.stderr)
+    books = build_workbooks(mix, args.workbook_dir)
+
+    clients, pid, cleanup = make_clients(args, args.users)
+    recorder = Recorder()
+    started_at = datetime.now()
+    started = time.monotonic()
+    deadline = started + args.duration
+
+    sampler = asyncio.create_task(sample_rss(recorder, pid, started, args.rss_interval)) if pid else None
+    try:
+        await asyncio.gather(*[
+            virtual_user(i, client, recorder, books, (args.think_min, args.think_max), deadline, args.iterations)
+            for i, client in enumerate(clients)
+        ])
+    finally:
+        elapsed = time.monotonic() - started
+        if sampler:
+            sampler.cancel()
+        for client in clients:
+            await client.aclose()
+        cleanup()
+
+    result = recorder.summary(elapsed)
+    result["config"] = {
+        "target": args.base_url or "in-process",
+        "users": args.users,
+        "duration_s": args.duration,
+        "iterations": args.iterations,
+        "think_s": [args.think_min, args.think_max],
+        "mix": args.mix,
+        "elapsed_s": round(elapsed, 2),
+        "started_at": started_at.isoformat(timespec="seconds"),
+    }
+    return result
+
+
+def print_report(result: dict, baseline: dict | None = None) -> None:
+    header = f"{'endpoint':<12}{'req':>7}{'err%':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, m in result["endpoints"].items():
+        line = (f"{name:<12}{m['requests']:>7}{m['error_rate'] * 100:>6.1f}%{m['throughput_rps']:>9.2f}"
+                f"{m['p50_ms']:>10.1f}{m['p95_ms']:>10.1f}{m['p99_ms']:>10.1f}")
+        if baseline and name in baseline.get("endpoints", {}):
+            b = baseline["endpoints"][name]
+            line += f"   (p95 {m['p95_ms'] - b['p95_ms']:+.1f} ms, rps {m['throughput_rps'] - b['throughput_rps']:+.2f})"
+        print(line)
+    print(f"\nRSS đỉnh: {result['peak_rss_mb']} MB", end="")
+    if baseline:
+        print(f" (lần trước {baseline.get('peak_rss_mb', 0)} MB)", end="")
+    print()
+    for message, count in result["errors"].items():
+        print(f"✗ {count}x {message}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test luồng upload -> preview -> get-columns -> convert -> download")
+    parser.add_argument("--base-url", help="URL server (bỏ trống = chạy app trong cùng process)")
+    parser.add_argument("--server-pid", type=int, help="PID uvicorn để đo RSS khi dùng --base-url")
+    parser.add_argument("--session-db", help="File SQLite session của server (SESSION_BACKEND=sqlite) để tạo session test")
+    parser.add_argument("--session-cookie", help="Giá trị cookie 'session' có sẵn khi dùng --base-url")
+    parser.add_argument("-u", "--users", type=int, default=5, help="Số virtual user")
+    parser.add_argument("-d", "--duration", type=float, default=60, help="Thời gian chạy (giây)")
+    parser.add_argument("-n", "--iterations", type=int, help="Số lượt mỗi user (mặc định: chạy đến hết duration)")
+    parser.add_argument("--think-min", type=float, default=0.5, help="Think time tối thiểu giữa các bước (giây)")
+    parser.add_argument("--think-max", type=float, default=2.0, help="Think time tối đa giữa các bước (giây)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Workbook mix 'tên:dòngxcột:trọng_số,...' (mặc định {DEFAULT_MIX})")
+    parser.add_argument("--workbook-dir", default=os.path.join(tempfile.gettempdir(), "loadtest_workbooks"))
+    parser.add_argument("--timeout", type=float, default=600, help="Timeout mỗi request (giây)")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="Chu kỳ đo RSS (giây)")
+    parser.add_argument("-o", "--output", help="File JSON kết quả (mặc định loadtest_results/<thời điểm>.json)")
+    parser.add_argument("--compare", help="File JSON kết quả lần chạy trước để so sánh")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+
+    output = args.output or os.path.join("loadtest_results", datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(result, baseline)
+    print(f"\nĐã lưu kết quả: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,17 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, List, Literal, Union
+import json
 import os
 import time
 import threading
 from datetime import datetime
 import socket
-from starlette.middleware.sessions import SessionMiddleware
+from session_store import ServerSideSessionMiddleware, create_session_backend
 from auth_oidc import (
     login_page,
     login_google,
@@ -20,9 +23,20 @@ from excel_processor import (
     get_sheet_names,
     preview_sheet_data,
     get_column_headers,
+    get_sheet_dimensions,
     convert_excel_to_docx,
+    validate_filter,
     ExcelProcessorError
 )
+from scheduler import ConversionScheduler, estimate_job_cost
+from admission import (
+    AdmissionError,
+    ConversionWorkerPool,
+    MemoryBudget,
+    estimate_job_memory,
+)
+from starlette.concurrency import run_in_threadpool
+from singleflight import SingleFlight, file_identity, remember_file_identity
 
 import os
 from dotenv import load_dotenv
@@ -46,9 +60,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Session lưu ở server, cookie chỉ chứa session id
+# memory: mặc định (1 worker) | sqlite: dùng chung giữa nhiều worker
+SECRET_KEY = os.getenv("SECRET_KEY", "change-this-secret")
+SESSION_TTL = int(os.getenv("SESSION_TTL", 14 * 24 * 3600))
+session_backend = create_session_backend(
+    os.getenv("SESSION_BACKEND", "memory"),
+    ttl=SESSION_TTL,
+    path=os.getenv("SESSION_DB_PATH", "sessions/sessions.db"),
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", 10000)),
+)
+
 app.add_middleware(
-    SessionMiddleware,
-    secret_key=os.getenv("SECRET_KEY", "change-this-secret"),
+    ServerSideSessionMiddleware,
+    backend=session_backend,
+    secret_key=SECRET_KEY,
+    max_age=SESSION_TTL,
     same_site="lax",
     https_only=False,   # True nếu chạy HTTPS
 )
@@ -84,12 +111,45 @@ app.add_api_route(
     include_in_schema=False,
 )
 
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """Điều kiện lọc sai trả 400 kèm thông báo như các lỗi khác, lỗi validate còn lại giữ 422 mặc định"""
+    for error in exc.errors():
+        if error.get("type") == "value_error" and "filters" in error.get("loc", ()):
+            return JSONResponse(status_code=400, content={"detail": str(error["ctx"]["error"])})
+    return await request_validation_exception_handler(request, exc)
+
 # CONFIGURATION
 UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
 OUTPUT_FOLDER = os.getenv('OUTPUT_FOLDER', 'outputs')
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 50 * 1024 * 1024))
 ALLOWED_EXTENSIONS = set(os.getenv('ALLOWED_EXTENSIONS', '.xlsx').split(','))
 CLEANUP_HOURS = int(os.getenv('CLEANUP_HOURS', 24))
+CONVERT_MAX_CONCURRENT = int(os.getenv('CONVERT_MAX_CONCURRENT', 2))
+CONVERT_PER_USER_LIMIT = int(os.getenv('CONVERT_PER_USER_LIMIT', 1))
+CONVERT_MAX_QUEUE = int(os.getenv('CONVERT_MAX_QUEUE', 50))
+MEMORY_BUDGET_MB = int(os.getenv('MEMORY_BUDGET_MB', 1200))          # container mem_limit: 2g
+WORKER_MAX_TASKS = int(os.getenv('WORKER_MAX_TASKS', 20))            # tạo lại worker sau N job
+WORKER_RSS_LIMIT_MB = int(os.getenv('WORKER_RSS_LIMIT_MB', 700))     # tạo lại worker khi RSS vượt ngưỡng
+
+# Hàng đợi convert chia đều theo user, chạy trong process pool có giới hạn RAM.
+# MEMORY_BUDGET_MB bao cả RAM nền của các worker, phần còn lại chia cho job
+conversion_pool = ConversionWorkerPool(
+    max_workers=CONVERT_MAX_CONCURRENT,
+    max_tasks_per_child=WORKER_MAX_TASKS,
+    rss_limit_bytes=WORKER_RSS_LIMIT_MB * 1024 * 1024,
+)
+conversion_scheduler = ConversionScheduler(
+    max_concurrent=CONVERT_MAX_CONCURRENT,
+    per_user_limit=CONVERT_PER_USER_LIMIT,
+    executor=conversion_pool,
+    memory_budget=MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024 - conversion_pool.resident_bytes),
+    max_queue=CONVERT_MAX_QUEUE,
+)
+
+# Gộp các request preview/get-columns/convert trùng nhau đang chạy cùng lúc
+request_coalescer = SingleFlight()
 
 
 # REQUEST MODELS
@@ -123,6 +183,36 @@ class ColumnsRequest(BaseModel):
         }
 
 
+class RowFilter(BaseModel):
+    column: str = Field(..., description="Tên cột dùng để lọc (không bắt buộc nằm trong danh sách xuất)")
+    op: Literal["equals", "contains", "in", "range"] = Field("equals", description="Toán tử lọc")
+    value: Optional[str] = Field(None, description="Giá trị cho equals / contains")
+    values: Optional[List[str]] = Field(None, max_length=500, description="Danh sách giá trị cho in")
+    min: Optional[Union[float, str]] = Field(None, description="Cận dưới cho range (số hoặc ngày)")
+    max: Optional[Union[float, str]] = Field(None, description="Cận trên cho range (số hoặc ngày)")
+
+    @field_validator("min", "max", mode="before")
+    @classmethod
+    def reject_bool_bound(cls, bound, info):
+        # Không để true/false bị ép thành 1.0/0.0
+        if isinstance(bound, bool):
+            raise ValueError(f"Điều kiện range của cột '{info.data.get('column')}': min/max phải là số hoặc ngày")
+        return bound
+
+    @model_validator(mode="after")
+    def check_filter(self):
+        try:
+            validate_filter(self.model_dump(exclude_none=True))
+        except ExcelProcessorError as e:
+            raise ValueError(str(e))
+        return self
+
+
+class SortKey(BaseModel):
+    column: str = Field(..., description="Cột sắp xếp")
+    descending: bool = Field(False, description="Sắp xếp giảm dần")
+
+
 class ConvertRequest(BaseModel):
     filename: str = Field(..., description="Tên file Excel")
     sheet: str = Field(..., description="Tên sheet")
@@ -130,6 +220,8 @@ class ConvertRequest(BaseModel):
     header_row: int = Field(..., ge=1, description="Dòng chứa header")
     data_start_row: int = Field(..., ge=2, description="Dòng bắt đầu data")
     data_end_row: Optional[int] = Field(None, description="Dòng kết thúc (null = hết sheet)")
+    filters: List[RowFilter] = Field(default_factory=list, max_length=20, description="Điều kiện lọc (AND)")
+    sort_by: Optional[SortKey] = Field(None, description="Sắp xếp bản ghi trước khi xuất")
     
     class Config:
         json_schema_extra = {
@@ -139,7 +231,9 @@ class ConvertRequest(BaseModel):
                 "columns": ["Tên", "Email", "SĐT"],
                 "header_row": 2,
                 "data_start_row": 3,
-                "data_end_row": 100
+                "data_end_row": 100,
+                "filters": [{"column": "Phòng ban", "op": "equals", "value": "Kế toán"}],
+                "sort_by": {"column": "Tên", "descending": False}
             }
         }
 
@@ -167,12 +261,21 @@ def cleanup_old_files(folder: str, max_age_hours: int = 24):
         print(f"✗ Lỗi khi cleanup: {e}")
 
 
+def cleanup_sessions():
+    """Xóa session đã hết hạn khỏi backend"""
+    try:
+        session_backend.cleanup()
+    except Exception as e:
+        print(f"✗ Lỗi khi dọn session: {e}")
+
+
 def schedule_cleanup():
     """Chạy cleanup định kỳ mỗi giờ"""
     def run_cleanup():
         while True:
             cleanup_old_files(UPLOAD_FOLDER, max_age_hours=24)
             cleanup_old_files(OUTPUT_FOLDER, max_age_hours=24)
+            cleanup_sessions()
             time.sleep(3600)
     
     cleanup_thread = threading.Thread(target=run_cleanup, daemon=True)
@@ -272,6 +375,7 @@ async def upload_file(file: UploadFile = File(...)):
         # Lưu file
         with open(filepath, 'wb') as f:
             f.write(contents)
+        remember_file_identity(filepath, contents)
         
         # Lấy danh sách sheets
         sheets = get_sheet_names(filepath)
@@ -315,7 +419,11 @@ async def preview_sheet(data: PreviewRequest):
         if not os.path.exists(filepath):
             raise HTTPException(404, 'File không tồn tại. Vui lòng upload lại')
         
-        result = preview_sheet_data(filepath, data.sheet, data.num_rows)
+        identity = await run_in_threadpool(file_identity, filepath)
+        result = await request_coalescer.do(
+            ("preview", identity, data.sheet, data.num_rows),
+            lambda: run_in_threadpool(preview_sheet_data, filepath, data.sheet, data.num_rows),
+        )
         return result
         
     except ExcelProcessorError as e:
@@ -345,7 +453,11 @@ async def get_columns(data: ColumnsRequest):
         if not os.path.exists(filepath):
             raise HTTPException(404, 'File không tồn tại. Vui lòng upload lại')
         
-        headers = get_column_headers(filepath, data.sheet, data.header_row)
+        identity = await run_in_threadpool(file_identity, filepath)
+        headers = await request_coalescer.do(
+            ("get-columns", identity, data.sheet, data.header_row),
+            lambda: run_in_threadpool(get_column_headers, filepath, data.sheet, data.header_row),
+        )
         
         if not headers:
             raise HTTPException(
@@ -364,7 +476,7 @@ async def get_columns(data: ColumnsRequest):
 
 
 @app.post('/convert', tags=["Conversion"])
-async def convert(data: ConvertRequest):
+async def convert(data: ConvertRequest, request: Request):
     """
     🔄 Chuyển đổi Excel sang DOCX
     
@@ -375,6 +487,8 @@ async def convert(data: ConvertRequest):
     - **header_row**: Dòng chứa header (≥1)
     - **data_start_row**: Dòng bắt đầu data (≥2)
     - **data_end_row**: Dòng kết thúc (optional, null = đến cuối sheet)
+    - **filters**: Điều kiện lọc (optional): equals, contains, in, range (số/ngày)
+    - **sort_by**: Cột sắp xếp (optional)
     
     **Returns:**
     - `success`: true
@@ -386,6 +500,8 @@ async def convert(data: ConvertRequest):
     **Errors:**
     - `400`: Tham số không hợp lệ
     - `404`: File không tồn tại
+    - `413`: Job cần nhiều RAM hơn toàn bộ quỹ bộ nhớ
+    - `503`: Hàng đợi convert đã đầy
     - `500`: Lỗi khi convert
     """
     try:
@@ -407,19 +523,65 @@ async def convert(data: ConvertRequest):
         if not os.path.exists(input_path):
             raise HTTPException(404, 'File không tồn tại. Vui lòng upload lại')
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"output_{timestamp}.docx"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-        
-        # Convert (blocking operation - có thể cải tiến thành async)
-        row_count = convert_excel_to_docx(
-            input_path, 
-            output_path, 
-            data.sheet, 
-            data.columns, 
-            data.header_row, 
-            data.data_start_row,
-            data.data_end_row
+        user_id = (request.session.get("user") or {}).get("sub", "anonymous")
+        filters = [f.model_dump(exclude_none=True) for f in data.filters]
+        sort_by = data.sort_by.model_dump() if data.sort_by else None
+        
+        async def run_convert():
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            output_filename = f"output_{timestamp}.docx"
+            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+            
+            # Ước lượng chi phí từ kích thước sheet để job nhỏ được ưu tiên
+            total_rows, total_cols = await run_in_threadpool(
+                get_sheet_dimensions, input_path, data.sheet
+            )
+            dims = (
+                total_rows,
+                total_cols,
+                len(data.columns),
+                data.header_row,
+                data.data_start_row,
+                data.data_end_row,
+            )
+            cost = estimate_job_cost(*dims)
+            memory = estimate_job_memory(*dims)
+            
+            # Convert chạy qua scheduler (process pool), không chặn event loop.
+            # workers=1: mỗi job chỉ dùng đúng 1 process của pool, khớp với ước lượng
+            # estimate_job_memory và MEMORY_BUDGET_MB (không sinh thêm process render)
+            row_count = await conversion_scheduler.submit(
+                user_id,
+                cost,
+                convert_excel_to_docx,
+                input_path, 
+                output_path, 
+                data.sheet, 
+                data.columns, 
+                data.header_row, 
+                data.data_start_row,
+                data.data_end_row,
+                memory=memory,
+                workers=1,
+                filters=filters,
+                sort_by=sort_by,
+            )
+            return output_filename, row_count
+        
+        # Request trùng (double-click, cùng workbook) dùng chung 1 lần convert và 1 file output
+        identity = await run_in_threadpool(file_identity, input_path)
+        output_filename, row_count = await request_coalescer.do(
+            (
+                "convert",
+                identity,
+                data.sheet,
+                tuple(data.columns),
+                data.header_row,
+                data.data_start_row,
+                data.data_end_row,
+                json.dumps([filters, sort_by], sort_keys=True, ensure_ascii=False),
+            ),
+            run_convert,
         )
         
         return {
@@ -432,6 +594,8 @@ async def convert(data: ConvertRequest):
         
     except ExcelProcessorError as e:
         raise HTTPException(400, str(e))
+    except AdmissionError as e:
+        raise HTTPException(e.status_code, str(e))
     except HTTPException:
         raise
     except ValueError as e:
@@ -487,6 +651,23 @@ async def health_check():
     }
 
 
+@app.get('/scheduler/stats', tags=["System"])
+async def scheduler_stats():
+    """
+    Thống kê hàng đợi convert: queue depth, job đang chạy, thời gian chờ,
+    quỹ bộ nhớ và số lần tạo lại worker
+    """
+    return conversion_scheduler.stats()
+
+
+@app.get('/coalescing/stats', tags=["System"])
+async def coalescing_stats():
+    """
+    Số request đã chạy thật / đã được gộp vào request trùng đang chạy
+    """
+    return request_coalescer.stats()
+
+
 @app.get('/info', tags=["System"])
 async def info():
     """
@@ -535,4 +716,5 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Chạy khi app tắt"""
+    conversion_scheduler.executor.shutdown(wait=False, cancel_futures=True)
     print("\nShutting down Excel to DOCX Converter...\n")
@@ -0,0 +1,206 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from admission import AdmissionError, MemoryBudget, job_cells
+
+
+def estimate_job_cost(
+    total_rows: int,
+    total_cols: int,
+    num_columns: int,
+    header_row: int,
+    data_start_row: int,
+    data_end_row: Optional[int] = None,
+) -> float:
+    """
+    Ước lượng chi phí 1 job convert (đơn vị ~ số ô phải xử lý).
+    pd.read_excel đọc cả sheet, còn phần render DOCX chỉ tỉ lệ với số dòng * số cột đã chọn
+    nhưng chậm hơn nhiều trên mỗi ô.
+    """
+    read_cells, render_cells = job_cells(
+        total_rows, total_cols, num_columns, header_row, data_start_row, data_end_row
+    )
+    return float(max(read_cells + render_cells * 10, 1))
+
+
+class _Job:
+    __slots__ = ("seq", "user", "cost", "memory", "func", "future", "enqueued_at")
+
+    def __init__(self, seq: int, user: str, cost: float, memory: int, func: Callable, future: asyncio.Future):
+        self.seq = seq
+        self.user = user
+        self.cost = cost
+        self.memory = memory
+        self.func = func
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class ConversionScheduler:
+    """
+    Hàng đợi convert chia theo user (session["user"]["sub"]).
+
+    - Weighted fair queuing: mỗi user có "virtual finish time", job được chọn là
+      job có finish time nhỏ nhất => user gửi nhiều/ file lớn không chiếm hết lượt.
+    - Trong cùng 1 user, job nhỏ (cost thấp) chạy trước.
+    - Giới hạn số job chạy đồng thời toàn cục và theo từng user.
+    - Nếu có memory_budget: job phải giữ chỗ RAM ước lượng trước khi chạy.
+      Job đến lượt mà chưa đủ RAM thì cả hàng đợi dừng chờ RAM được trả lại,
+      không cho job nhỏ hơn chen lên (job lớn không bị bỏ đói);
+      job lớn hơn cả quỹ hoặc hàng đợi đầy thì bị từ chối.
+    Job chạy trong executor (mặc định thread pool của event loop) để không chặn các request khác.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        per_user_limit: int = 1,
+        weights: Optional[dict[str, float]] = None,
+        history_size: int = 1000,
+        executor: Optional[Executor] = None,
+        memory_budget: Optional[MemoryBudget] = None,
+        max_queue: Optional[int] = None,
+    ) -> None:
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self.weights = weights or {}
+        self.executor = executor
+        self.memory_budget = memory_budget
+        self.max_queue = max_queue
+
+        self._queues: dict[str, list[_Job]] = {}
+        self._running: dict[str, int] = {}
+        self._finish_tags: dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+        self._waits: deque = deque(maxlen=history_size)
+        self._completed = 0
+        self._failed = 0
+
+    # ---------- Public API ----------
+
+    async def submit(self, user: str, cost: float, func: Callable, *args: Any, memory: int = 0, **kwargs: Any) -> Any:
+        if self.memory_budget and not self.memory_budget.fits(memory):
+            self.memory_budget.rejected += 1
+            raise AdmissionError(
+                f"File quá lớn để xử lý (cần ~{memory / 1024 / 1024:.0f}MB RAM). "
+                "Vui lòng giảm số dòng hoặc số cột",
+                status_code=413,
+            )
+        if self.max_queue is not None and self._queue_depth() >= self.max_queue:
+            raise AdmissionError("Hệ thống đang quá tải, vui lòng thử lại sau", status_code=503)
+
+        loop = asyncio.get_running_loop()
+        job = _Job(next(self._seq), user, cost, memory, partial(func, *args, **kwargs), loop.create_future())
+        self._queues.setdefault(user, []).append(job)
+        self._dispatch()
+
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            # Client ngắt kết nối khi job còn trong hàng đợi => bỏ job
+            queue = self._queues.get(user)
+            if queue and job in queue:
+                queue.remove(job)
+            raise
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        stats = {
+            "queue_depth": self._queue_depth(),
+            "running": sum(self._running.values()),
+            "max_concurrent": self.max_concurrent,
+            "per_user_limit": self.per_user_limit,
+            "queued_by_user": {u: len(q) for u, q in self._queues.items() if q},
+            "running_by_user": {u: n for u, n in self._running.items() if n},
+            "completed": self._completed,
+            "failed": self._failed,
+            "wait_seconds": {
+                "count": len(waits),
+                "avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                "p50": round(_percentile(waits, 50), 4),
+                "p95": round(_percentile(waits, 95), 4),
+                "max": round(waits[-1], 4) if waits else 0.0,
+            },
+        }
+        if self.memory_budget:
+            stats["memory"] = self.memory_budget.stats()
+        if hasattr(self.executor, "stats"):
+            stats["workers"] = self.executor.stats()
+        return stats
+
+    # ---------- Internals ----------
+
+    def _queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _pick(self) -> Optional[tuple[_Job, float, float]]:
+        best = None
+        for user, queue in self._queues.items():
+            if not queue or self._running.get(user, 0) >= self.per_user_limit:
+                continue
+            job = min(queue, key=lambda j: (j.cost, j.seq))
+            start = max(self._virtual_time, self._finish_tags.get(user, 0.0))
+            finish = start + job.cost / self.weights.get(user, 1.0)
+            if best is None or (finish, job.seq) < (best[1], best[0].seq):
+                best = (job, finish, start)
+        return best
+
+    def _dispatch(self) -> None:
+        while sum(self._running.values()) < self.max_concurrent:
+            picked = self._pick()
+            if picked is None:
+                return
+            job, finish, start = picked
+
+            if job.future.done():
+                self._remove(job)
+                continue
+            if self.memory_budget and not self.memory_budget.try_reserve(job.memory):
+                # Giữ nguyên lượt của job này, chờ _run trả RAM rồi dispatch lại
+                return
+
+            self._remove(job)
+            self._virtual_time = max(self._virtual_time, start)
+            self._finish_tags[job.user] = finish
+            self._running[job.user] = self._running.get(job.user, 0) + 1
+            self._waits.append(time.monotonic() - job.enqueued_at)
+            asyncio.ensure_future(self._run(job))
+
+    def _remove(self, job: _Job) -> None:
+        self._queues[job.user].remove(job)
+        if not self._queues[job.user]:
+            del self._queues[job.user]
+
+    async def _run(self, job: _Job) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, job.func)
+        except Exception as e:
+            self._failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self._completed += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            if self.memory_budget:
+                self.memory_budget.release(job.memory)
+            self._running[job.user] -= 1
+            if not self._running[job.user]:
+                del self._running[job.user]
+            self._dispatch()
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
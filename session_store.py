@@ -0,0 +1,233 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+import itsdangerous
+from itsdangerous.exc import BadSignature
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# ---------- Backends ----------
+# Dữ liệu session lưu ở server dưới dạng JSON; cookie chỉ giữ session id (đã ký).
+# Hạn của session trượt theo lần truy cập: get() gia hạn thêm ttl giây.
+
+class MemorySessionBackend:
+    """LRU trong RAM, mỗi session hết hạn sau ttl giây. Chỉ dùng cho 1 worker."""
+
+    def __init__(self, ttl: int, max_entries: int = 10000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> typing.Optional[str]:
+        with self._lock:
+            item = self._data.get(session_id)
+            if item is None:
+                return None
+            expires_at, payload = item
+            now = time.time()
+            if expires_at < now:
+                del self._data[session_id]
+                return None
+            self._data[session_id] = (now + self.ttl, payload)
+            self._data.move_to_end(session_id)
+            return payload
+
+    def set(self, session_id: str, payload: str) -> None:
+        with self._lock:
+            self._data[session_id] = (time.time() + self.ttl, payload)
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def cleanup(self) -> None:
+        now = time.time()
+        with self._lock:
+            for session_id in [k for k, (expires_at, _) in self._data.items() if expires_at < now]:
+                del self._data[session_id]
+
+
+class SQLiteSessionBackend:
+    """Lưu session vào file SQLite, dùng chung được giữa nhiều worker uvicorn."""
+
+    def __init__(self, path: str, ttl: int) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, expires_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> typing.Optional[str]:
+        row = self._connect().execute(
+            "SELECT expires_at, payload FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[0] < now:
+            self.delete(session_id)
+            return None
+        if row[0] - now < self.ttl / 2:
+            # Chỉ ghi lại hạn khi đã qua nửa ttl, tránh 1 lần ghi SQLite cho mỗi request
+            with self._connect() as conn:
+                conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (now + self.ttl, session_id))
+        return row[1]
+
+    def set(self, session_id: str, payload: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, expires_at, payload) VALUES (?, ?, ?)",
+                (session_id, time.time() + self.ttl, payload),
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def cleanup(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+
+def create_session_backend(kind: str, ttl: int, path: str = "sessions.db", max_entries: int = 10000):
+    """kind = "memory" | "sqlite" """
+    if kind == "memory":
+        return MemorySessionBackend(ttl=ttl, max_entries=max_entries)
+    if kind == "sqlite":
+        return SQLiteSessionBackend(path=path, ttl=ttl)
+    raise ValueError(f"SESSION_BACKEND không hợp lệ: {kind}")
+
+
+# ---------- Middleware ----------
+
+def issue_session_cookie(backend, secret_key: str, data: dict) -> str:
+    """Tạo session ở backend và trả về giá trị cookie (dùng cho load test / script)."""
+    session_id = secrets.token_urlsafe(32)
+    backend.set(session_id, json.dumps(data))
+    return itsdangerous.TimestampSigner(str(secret_key)).sign(session_id.encode("utf-8")).decode("utf-8")
+
+
+class ServerSideSessionMiddleware:
+    """
+    Thay cho starlette SessionMiddleware: request.session vẫn là dict như cũ,
+    nhưng cookie chỉ chứa session id đã ký thay vì toàn bộ token/profile.
+    Chỉ ghi backend khi session thay đổi, chỉ gửi Set-Cookie khi cấp id mới, logout,
+    hoặc khi chữ ký cookie đã qua nửa max_age (ký lại để phiên đang dùng không hết hạn).
+    Khi session nhận/đổi "user" (đăng nhập) thì cấp id mới và xóa id cũ để chống session fixation.
+    Backend (SQLite có thể chờ khóa) luôn chạy trong threadpool, không chặn event loop.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend,
+        secret_key: str,
+        session_cookie: str = "session",
+        max_age: int = 14 * 24 * 60 * 60,
+        path: str = "/",
+        same_site: typing.Literal["lax", "strict", "none"] = "lax",
+        https_only: bool = False,
+    ) -> None:
+        self.app = app
+        self.backend = backend
+        self.signer = itsdangerous.TimestampSigner(str(secret_key))
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:
+            self.security_flags += "; secure"
+
+    async def _load(self, connection: HTTPConnection) -> tuple[typing.Optional[str], typing.Optional[str], float]:
+        """Trả về (session id, payload, tuổi của chữ ký cookie tính bằng giây)."""
+        cookie = connection.cookies.get(self.session_cookie)
+        if not cookie:
+            return None, None, 0.0
+        try:
+            signed_id, signed_at = self.signer.unsign(
+                cookie.encode("utf-8"), max_age=self.max_age, return_timestamp=True
+            )
+        except BadSignature:
+            return None, None, 0.0
+        session_id = signed_id.decode("utf-8")
+        payload = await run_in_threadpool(self.backend.get, session_id)
+        return session_id, payload, time.time() - signed_at.timestamp()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id, payload, cookie_age = await self._load(HTTPConnection(scope))
+        scope["session"] = json.loads(payload) if payload else {}
+        initial_user = scope["session"].get("user")
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                if session:
+                    new_payload = json.dumps(session)
+                    logged_in = "user" in session and session["user"] != initial_user
+                    if session_id is not None and logged_in:
+                        # id cấp trước khi đăng nhập (vd. lúc lưu OAuth state) không được dùng tiếp
+                        await run_in_threadpool(self.backend.delete, session_id)
+                        session_id = None
+                    if session_id is None:
+                        session_id = secrets.token_urlsafe(32)
+                        await run_in_threadpool(self.backend.set, session_id, new_payload)
+                        self._set_cookie(message, self._sign(session_id))
+                    else:
+                        if new_payload != payload:
+                            await run_in_threadpool(self.backend.set, session_id, new_payload)
+                        if cookie_age > self.max_age / 2:
+                            self._set_cookie(message, self._sign(session_id))
+                elif session_id is not None:
+                    # Session đã bị clear (logout)
+                    await run_in_threadpool(self.backend.delete, session_id)
+                    self._set_cookie(message, "null", expired=True)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _sign(self, session_id: str) -> str:
+        return self.signer.sign(session_id.encode("utf-8")).decode("utf-8")
+
+    def _set_cookie(self, message: Message, value: str, expired: bool = False) -> None:
+        if expired:
+            lifetime = "expires=Thu, 01 Jan 1970 00:00:00 GMT; "
+        else:
+            lifetime = f"Max-Age={self.max_age}; "
+        headers = MutableHeaders(scope=message)
+        headers.append(
+            "Set-Cookie",
+            f"{self.session_cookie}={value}; path={self.path}; {lifetime}{self.security_flags}",
+        )
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Gộp các request giống hệt nhau đang chạy cùng lúc: request đầu tiên thực
+    sự chạy, các request trùng key chờ chung một future => N request trùng
+    chỉ tốn 1 lần parse. Key là tuple, phần tử đầu là tên nhóm (endpoint).
+    Job chỉ bị hủy khi mọi request đang chờ nó đều đã ngắt kết nối.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._waiters: dict[asyncio.Future, int] = {}
+        self._executed: dict[str, int] = {}
+        self._coalesced: dict[str, int] = {}
+
+    async def do(self, key: tuple, func: Callable[[], Awaitable[Any]]) -> Any:
+        group = str(key[0])
+        future = self._inflight.get(key)
+        if future is not None:
+            self._coalesced[group] = self._coalesced.get(group, 0) + 1
+        else:
+            self._executed[group] = self._executed.get(group, 0) + 1
+            future = asyncio.ensure_future(func())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        # shield: 1 client ngắt kết nối không hủy job của các client đang chờ chung
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[future] == 1 and not future.done():
+                # Người chờ cuối cùng đã bỏ đi => hủy job (scheduler gỡ job khỏi hàng đợi)
+                future.cancel()
+            raise
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+
+    def _done(self, key: tuple, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # tránh cảnh báo "exception was never retrieved"
+
+    def stats(self) -> dict:
+        groups = sorted(set(self._executed) | set(self._coalesced))
+        return {
+            "in_flight": len(self._inflight),
+            "groups": {
+                g: {
+                    "executed": self._executed.get(g, 0),
+                    "coalesced": self._coalesced.get(g, 0),
+                }
+                for g in groups
+            },
+        }
+
+
+# ---------- Định danh file theo nội dung ----------
+# Cùng 1 workbook do nhiều người upload (tên file khác nhau) vẫn gộp được.
+
+_identity_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_identity_lock = threading.Lock()
+_IDENTITY_CACHE_SIZE = 1024
+
+
+def _stat_key(path: str) -> tuple:
+    st = os.stat(path)
+    return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+def remember_file_identity(path: str, content: bytes) -> str:
+    """Gọi lúc upload khi đã có sẵn bytes trong RAM, để không phải đọc lại file."""
+    digest = hashlib.sha256(content).hexdigest()
+    _store_identity(_stat_key(path), digest)
+    return digest
+
+
+def file_identity(path: str) -> str:
+    """sha256 nội dung file, cache theo (path, size, mtime) nên chỉ hash 1 lần."""
+    key = _stat_key(path)
+    with _identity_lock:
+        digest = _identity_cache.get(key)
+        if digest is not None:
+            _identity_cache.move_to_end(key)
+            return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _store_identity(key, digest)
+    return digest
+
+
+def _store_identity(key: tuple, digest: str) -> None:
+    with _identity_lock:
+        _identity_cache[key] = digest
+        _identity_cache.move_to_end(key)
+        while len(_identity_cache) > _IDENTITY_CACHE_SIZE:
+            _identity_cache.popitem(last=False)
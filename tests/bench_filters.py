@@ -0,0 +1,46 @@
+"""
+Benchmark lọc trước khi render: thời gian convert theo độ chọn lọc 1% / 10% / 100%.
+
+    python tests/bench_filters.py --rows 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import make_workbook  # noqa: E402
+from excel_processor import convert_excel_to_docx  # noqa: E402
+
+COLUMNS = ["Tên", "Phòng ban", "Email"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--selectivity", type=int, nargs="+", default=[1, 10, 100], help="Phần trăm số dòng được giữ")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cột "Nhóm" = i % 100 => range [0, k-1] chọn đúng k% số dòng
+        path = make_workbook(os.path.join(tmp, "bench.xlsx"), args.rows, extra=("Nhóm", lambda i: i % 100))
+        output = os.path.join(tmp, "out.docx")
+        print(f"{args.rows} dòng x {len(COLUMNS)} cột, {os.cpu_count()} CPU")
+
+        started = time.perf_counter()
+        convert_excel_to_docx(path, output, "Data", COLUMNS, 1, 2, workers=1)
+        baseline = time.perf_counter() - started
+        print(f"  không lọc          {args.rows:>7} dòng {baseline:8.2f}s")
+
+        for pct in args.selectivity:
+            condition = {"column": "Nhóm", "op": "range", "min": 0, "max": pct - 1}
+            started = time.perf_counter()
+            count = convert_excel_to_docx(path, output, "Data", COLUMNS, 1, 2, workers=1, filters=[condition])
+            seconds = time.perf_counter() - started
+            print(f"  lọc {pct:>3}%           {count:>7} dòng {seconds:8.2f}s  ({seconds / baseline:.0%} so với không lọc)")
+
+
+if __name__ == "__main__":
+    main()
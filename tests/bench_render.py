@@ -0,0 +1,60 @@
+"""
+Benchmark render DOCX: 1 body (cách cũ) / chia khối tuần tự / chia khối + process pool.
+
+    python tests/bench_render.py --rows 20000 --workers 1 2 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import excel_processor  # noqa: E402
+from conftest import make_workbook  # noqa: E402
+
+COLUMNS = ["Tên", "Phòng ban", "Email"]
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunk-rows", type=int, default=excel_processor.RENDER_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    excel_processor.RENDER_CHUNK_ROWS = args.chunk_rows
+    excel_processor.PARALLEL_MIN_ROWS = 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_workbook(os.path.join(tmp, "bench.xlsx"), args.rows)
+        rows = [[f"Người {i}", f"Phòng {i // 5}", f"user{i}@example.com"] for i in range(args.rows)]
+
+        def single_body():
+            doc = excel_processor._new_document()
+            excel_processor._render_rows(doc, rows, COLUMNS, 0, len(rows))
+
+        def chunked():
+            doc = excel_processor._new_document()
+            excel_processor._render_rows_chunked(doc, rows, COLUMNS)
+
+        print(f"{args.rows} dòng x {len(COLUMNS)} cột, chunk {args.chunk_rows} dòng, {os.cpu_count()} CPU")
+        print(f"  render 1 body (cách cũ)      {timed(single_body):8.2f}s")
+        print(f"  render chia khối tuần tự     {timed(chunked):8.2f}s")
+        for workers in args.workers:
+            output = os.path.join(tmp, f"out_{workers}.docx")
+            seconds = timed(lambda: excel_processor.convert_excel_to_docx(
+                path, output, "Data", COLUMNS, 1, 2, workers=workers
+            ))
+            print(f"  convert end-to-end workers={workers:<3} {seconds:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark session: starlette SessionMiddleware (cookie chứa cả session) so với
+ServerSideSessionMiddleware (cookie chỉ chứa id) với payload Google OAuth thực tế.
+
+    python tests/bench_session.py --requests 2000
+"""
+import argparse
+import base64
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.middleware.sessions import SessionMiddleware
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import MemorySessionBackend, ServerSideSessionMiddleware, SQLiteSessionBackend  # noqa: E402
+
+SECRET_KEY = "bench-secret"
+
+
+def _b64(nbytes: int) -> str:
+    return base64.urlsafe_b64encode(secrets.token_bytes(nbytes)).decode().rstrip("=")
+
+
+def google_user() -> dict:
+    """Cùng các khóa auth_oidc.auth_callback_google lưu vào session, độ dài token như Google cấp."""
+    return {
+        "sub": "1" + "".join(secrets.choice("0123456789") for _ in range(20)),
+        "email": "nguyen.van.a@example.com",
+        "name": "Nguyễn Văn A",
+        "picture": "https://lh3.googleusercontent.com/a/" + _b64(60) + "=s96-c",
+        "access_token": "ya29." + _b64(160),
+        "id_token": ".".join([_b64(100), _b64(600), _b64(256)]),  # JWT RS256 ~1.3KB
+    }
+
+
+def make_app(middleware, **options) -> FastAPI:
+    app = FastAPI()
+    user = google_user()
+
+    @app.get("/login")
+    async def login(request: Request):
+        request.session["user"] = user
+        return {}
+
+    @app.get("/ping")
+    async def ping(request: Request):
+        return {"sub": request.session["user"]["sub"]}
+
+    app.add_middleware(middleware, secret_key=SECRET_KEY, **options)
+    return app
+
+
+def measure(name: str, app: FastAPI, requests: int) -> None:
+    client = TestClient(app)
+    client.get("/login")
+    cookie = client.cookies["session"]
+
+    response = client.get("/ping")
+    resends = "set-cookie" in response.headers
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get("/ping")
+    per_request = (time.perf_counter() - started) / requests * 1000
+
+    print(f"  {name:<28} cookie {len(cookie):>5} B   Set-Cookie mỗi request: {'có' if resends else 'không':<6}"
+          f"{per_request:7.3f} ms/request")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.requests} request /ping sau khi đăng nhập (TestClient, gồm cả chi phí ASGI)")
+    measure("starlette SessionMiddleware", make_app(SessionMiddleware), args.requests)
+    measure("server-side (memory)", make_app(ServerSideSessionMiddleware, backend=MemorySessionBackend(ttl=3600)),
+            args.requests)
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteSessionBackend(os.path.join(tmp, "sessions.db"), ttl=3600)
+        measure("server-side (sqlite)", make_app(ServerSideSessionMiddleware, backend=backend), args.requests)
+
+
+if __name__ == "__main__":
+    main()
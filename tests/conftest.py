@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+from typing import Callable
+
+import pytest
+from openpyxl import Workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_workbook(
+    path: str,
+    rows: int,
+    sheet: str = "Data",
+    extra: tuple[str, Callable[[int], object]] | None = None,
+) -> str:
+    """
+    Dòng 1 header ["Tên", "Phòng ban", "Email"], data từ dòng 2.
+    "Phòng ban" chỉ có giá trị ở dòng đầu mỗi nhóm 5 dòng (mô phỏng ô merge => ffill).
+    extra = (tên cột, hàm i -> giá trị) thêm 1 cột thứ 4.
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet
+    ws.append(["Tên", "Phòng ban", "Email"] + ([extra[0]] if extra else []))
+    for i in range(rows):
+        row = [f"Người {i}", f"Phòng {i // 5}" if i % 5 == 0 else None, f"user{i}@example.com"]
+        ws.append(row + [extra[1](i)] if extra else row)
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    return make_workbook(str(tmp_path / "data.xlsx"), rows=300)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """Module main với thư mục upload/output tạm (phải đặt env trước khi import main)."""
+    workdir = tempfile.mkdtemp(prefix="convert_excel_test_")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+    os.environ["OUTPUT_FOLDER"] = os.path.join(workdir, "outputs")
+    os.makedirs(os.environ["UPLOAD_FOLDER"], exist_ok=True)
+    os.makedirs(os.environ["OUTPUT_FOLDER"], exist_ok=True)
+
+    import main
+
+    assert main.UPLOAD_FOLDER == os.environ["UPLOAD_FOLDER"], "main đã được import với thư mục khác"
+    yield main
+    main.conversion_scheduler.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import pytest
+
+from admission import JOB_BASE_BYTES, MB, ConversionWorkerPool, MemoryBudget, estimate_job_memory
+from conftest import make_workbook
+from excel_processor import convert_excel_to_docx, get_sheet_dimensions
+from loadtest import tree_rss
+from scheduler import ConversionScheduler
+
+COLUMNS = ["Tên", "Phòng ban", "Email"]
+
+
+def test_submit_does_not_race_with_recycle():
+    pool = ConversionWorkerPool(max_workers=1)
+    old = pool._executor
+    real_submit = old.submit
+
+    def racing_submit(*args, **kwargs):
+        # Một job khác vừa xong và báo RSS vượt ngưỡng đúng lúc đang submit
+        recycler = threading.Thread(target=pool._recycle, args=(old,))
+        recycler.start()
+        recycler.join(0.5)
+        return real_submit(*args, **kwargs)
+
+    old.submit = racing_submit
+    try:
+        future = pool.submit(partial(pow, 2, 10))
+        # Job đã nhận trên pool cũ vẫn chạy xong, pool cũ chỉ tắt sau đó
+        assert future.result(timeout=60) == 1024
+        assert pool.recycled == 1 and pool._executor is not old
+        assert pool.submit(partial(pow, 2, 3)).result(timeout=60) == 8
+    finally:
+        pool.shutdown(wait=True)
+
+
+def test_pool_recovers_after_worker_crash():
+    pool = ConversionWorkerPool(max_workers=1)
+    try:
+        # Worker chết giữa job (như bị OOM kill) => chỉ job đó lỗi
+        with pytest.raises(BrokenProcessPool):
+            pool.submit(partial(os._exit, 1)).result(timeout=60)
+        assert pool.submit(partial(pow, 2, 10)).result(timeout=60) == 1024
+        assert pool.recycled == 1
+
+        # Pool hỏng mà chưa được thay (submit đến trước _done) => submit tự thay pool
+        broken = pool._executor
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result(timeout=60)
+        assert pool.submit(partial(pow, 2, 3)).result(timeout=60) == 8
+        assert pool.recycled == 2 and pool._executor is not broken
+    finally:
+        pool.shutdown(wait=True)
+
+
+def test_pool_recycled_when_worker_rss_over_limit():
+    # Ngưỡng 1 byte => worker nào xong job cũng vượt, pool bị thay sau mỗi job
+    pool = ConversionWorkerPool(max_workers=2, rss_limit_bytes=1)
+    try:
+        futures = [pool.submit(partial(pow, 2, i)) for i in range(6)]
+        assert [f.result(timeout=60) for f in futures] == [2 ** i for i in range(6)]
+        assert pool.recycled > 0
+        assert pool.submit(partial(pow, 2, 10)).result(timeout=60) == 1024
+    finally:
+        pool.shutdown(wait=True)
+
+
+def test_dimensions_without_dimension_tag(tmp_path):
+    source = make_workbook(str(tmp_path / "source.xlsx"), rows=5000)
+    stripped = str(tmp_path / "stripped.xlsx")
+    # Bỏ thẻ <dimension> như file do một số công cụ khác xuất ra
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(stripped, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename.startswith("xl/worksheets/sheet"):
+                data = re.sub(rb"<dimension[^>]*/>", b"", data)
+            dst.writestr(item, data)
+
+    assert get_sheet_dimensions(stripped, "Data") == get_sheet_dimensions(source, "Data") == (5001, 3)
+    assert estimate_job_memory(5001, 3, len(COLUMNS), 1, 2, None) > JOB_BASE_BYTES
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="cần /proc (Linux)")
+def test_parallel_conversions_stay_within_memory_budget(tmp_path):
+    """
+    12 job convert lớn qua scheduler + ConversionWorkerPool dựng như trong main.py.
+    RSS đỉnh của cả cây process (trừ RSS sẵn có của process test) không vượt MEMORY_BUDGET_MB.
+    """
+    rows = int(os.getenv("STRESS_ROWS", 4000))
+    jobs = int(os.getenv("STRESS_JOBS", 12))
+    budget_mb = int(os.getenv("MEMORY_BUDGET_MB", 600))
+
+    workbook = make_workbook(str(tmp_path / "big.xlsx"), rows)
+    dims = (*get_sheet_dimensions(workbook, "Data"), len(COLUMNS), 1, 2, None)
+    memory = estimate_job_memory(*dims)
+
+    pool = ConversionWorkerPool(max_workers=4, max_tasks_per_child=3)
+    budget = MemoryBudget(budget_mb * MB - pool.resident_bytes)
+    assert memory * 2 <= budget.total_bytes < memory * 4, "budget phải là giới hạn, không phải max_workers"
+    scheduler = ConversionScheduler(
+        max_concurrent=4,
+        per_user_limit=jobs,
+        executor=pool,
+        memory_budget=budget,
+    )
+
+    baseline = tree_rss(os.getpid())
+    peak = baseline
+    sampling = True
+
+    def sample() -> None:
+        nonlocal peak
+        while sampling:
+            peak = max(peak, tree_rss(os.getpid()))
+            time.sleep(0.05)
+
+    async def run_all() -> list[int]:
+        return await asyncio.gather(*(
+            scheduler.submit(
+                f"user{i % 3}", 1.0, convert_excel_to_docx,
+                workbook, str(tmp_path / f"out_{i}.docx"), "Data", COLUMNS, 1, 2,
+                memory=memory, workers=1,
+            )
+            for i in range(jobs)
+        ))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        counts = asyncio.run(run_all())
+    finally:
+        sampling = False
+        sampler.join()
+        pool.shutdown(wait=True)
+
+    assert counts == [rows] * jobs
+    assert scheduler.stats()["completed"] == jobs
+    assert peak - baseline <= budget_mb * MB, (
+        f"RSS đỉnh {peak / MB:.0f}MB, sẵn có {baseline / MB:.0f}MB, budget {budget_mb}MB"
+    )
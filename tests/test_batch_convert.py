@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+from docx import Document
+from openpyxl import Workbook
+
+import batch_convert
+from conftest import make_workbook
+
+
+def run(tmp_path, *args: str) -> int:
+    return batch_convert.main([*args, "-o", str(tmp_path / "out"), "-j", "1"])
+
+
+def exported_text(path) -> str:
+    return "\n".join(p.text for p in Document(str(path)).paragraphs)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    os.makedirs(tmp_path / "in" / "sub")
+    make_workbook(str(tmp_path / "in" / "a.xlsx"), rows=10)
+    make_workbook(str(tmp_path / "in" / "sub" / "b.xlsx"), rows=20)
+    return tmp_path / "in"
+
+
+def test_converts_directory_keeping_subfolders(tmp_path, inputs, capsys):
+    assert run(tmp_path, str(inputs), "--columns", "Tên,Email") == 0
+    assert sorted(os.listdir(tmp_path / "out")) == ["a.docx", "sub"]
+    assert os.listdir(tmp_path / "out" / "sub") == ["b.docx"]
+    assert "Hoàn tất: 2/2 file, 30 bản ghi" in capsys.readouterr().out
+
+
+def test_rerun_skips_converted_files_unless_overwrite(tmp_path, inputs, capsys):
+    assert run(tmp_path, str(inputs), "--columns", "Tên") == 0
+    output = tmp_path / "out" / "a.docx"
+    output.write_bytes(b"stale")
+
+    # Chạy lại (resume) => giữ nguyên output đã có
+    assert run(tmp_path, str(inputs), "--columns", "Tên") == 0
+    assert "bỏ qua 2 file đã convert, cần xử lý 0 file" in capsys.readouterr().err
+    assert output.read_bytes() == b"stale"
+
+    assert run(tmp_path, str(inputs), "--columns", "Tên", "--overwrite") == 0
+    assert "Hoàn tất: 2/2 file" in capsys.readouterr().out
+    assert "Tên: Người 9" in exported_text(output)
+
+
+def test_sheet_and_columns_by_one_based_index(tmp_path):
+    wb = Workbook()
+    wb.active.title = "Bìa"
+    wb.active.append(["Không dùng"])
+    ws = wb.create_sheet("Data")
+    ws.append(["Mã", "Tên", "Email"])
+    ws.append(["NV01", "An", "an@example.com"])
+    os.makedirs(tmp_path / "in")
+    wb.save(tmp_path / "in" / "staff.xlsx")
+
+    spec = tmp_path / "spec.json"
+    spec.write_text(json.dumps({"sheet": 2, "columns": ["Email", 2]}), encoding="utf-8")
+
+    assert run(tmp_path, str(tmp_path / "in"), "--spec", str(spec)) == 0
+    text = exported_text(tmp_path / "out" / "staff.docx")
+    assert "Email: an@example.com" in text and "Tên: An" in text and "Mã" not in text
+
+    # Tham số dòng lệnh là chuỗi, vẫn hiểu là số thứ tự
+    assert run(tmp_path, str(tmp_path / "in"), "--sheet", "2", "--columns", "1", "--overwrite") == 0
+    assert "Mã: NV01" in exported_text(tmp_path / "out" / "staff.docx")
+
+
+def test_same_relative_path_from_two_roots_is_rejected(tmp_path):
+    for root in ("a", "b"):
+        os.makedirs(tmp_path / "in" / root)
+        make_workbook(str(tmp_path / "in" / root / "x.xlsx"), rows=5)
+
+    with pytest.raises(SystemExit, match="cùng một output"):
+        run(tmp_path, str(tmp_path / "in" / "a"), str(tmp_path / "in" / "b"), "--columns", "Tên")
+    assert not os.path.exists(tmp_path / "out")
+
+
+def test_failed_file_gives_nonzero_exit(tmp_path, inputs, capsys):
+    (inputs / "broken.xlsx").write_bytes(b"not a workbook")
+
+    assert run(tmp_path, str(inputs), "--columns", "Tên") == 1
+    captured = capsys.readouterr()
+    assert "broken.xlsx" in captured.err
+    assert "Hoàn tất: 2/3 file" in captured.out and "lỗi 1" in captured.out
+    # File lỗi không để lại output dở
+    assert not os.path.exists(tmp_path / "out" / "broken.docx")
+    assert not [name for name in os.listdir(tmp_path / "out") if name.endswith(".part")]
@@ -0,0 +1,162 @@
+import re
+from datetime import date
+
+import pytest
+from docx import Document
+from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
+from fastapi.testclient import TestClient
+from openpyxl import Workbook
+from pydantic import BaseModel, field_validator
+
+from excel_processor import ExcelProcessorError, convert_excel_to_docx, validate_filter
+
+COLUMNS = ["Tên", "Phòng ban"]
+
+# Ô trống được ffill như ô merge (kể cả cột lọc/sắp xếp), chỉ ô trống đầu cột còn trống.
+# "Phòng ban" chỉ ghi ở dòng đầu nhóm, "Ngày vào" có 1 ô gõ tay dd/mm/yyyy
+ROWS = [
+    ("An", "Kế toán", None, None),
+    ("Bình", None, 800, date(2023, 12, 20)),
+    ("Chi", None, 1500, date(2024, 3, 1)),
+    ("Dũng", "Kỹ thuật", 2500, date(2024, 1, 5)),
+    ("Em", None, 1500, date(2024, 2, 10)),
+    ("Giang", "Nhân sự", 300, date(2022, 7, 7)),
+    ("Hà", None, 1200, "15/01/2024"),
+    ("Khoa", None, None, None),
+]
+
+
+@pytest.fixture
+def staff(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(["Tên", "Phòng ban", "Lương", "Ngày vào"])
+    for row in ROWS:
+        ws.append(list(row))
+    path = str(tmp_path / "staff.xlsx")
+    wb.save(path)
+    return path
+
+
+def exported_names(workbook: str, tmp_path, **kwargs) -> list[str]:
+    output = str(tmp_path / "out.docx")
+    convert_excel_to_docx(workbook, output, "Data", COLUMNS, 1, 2, **kwargs)
+    return [
+        re.match(r"Tên: (\S+)", p.text).group(1)
+        for p in Document(output).paragraphs
+        if p.text.startswith("Tên: ")
+    ]
+
+
+@pytest.mark.parametrize(
+    "condition, expected",
+    [
+        # ffill trước khi lọc: Bình, Chi thuộc nhóm "Kế toán"
+        ({"column": "Phòng ban", "op": "equals", "value": "Kế toán"}, ["An", "Bình", "Chi"]),
+        ({"column": "Phòng ban", "op": "contains", "value": "KỸ"}, ["Dũng", "Em"]),
+        ({"column": "Phòng ban", "op": "in", "values": ["Nhân sự", "Kỹ thuật"]}, ["Dũng", "Em", "Giang", "Hà", "Khoa"]),
+        # Cột lọc không cần nằm trong danh sách xuất, ô trống (An) không khớp range
+        ({"column": "Lương", "op": "range", "min": 1000, "max": 2000}, ["Chi", "Em", "Hà", "Khoa"]),
+        ({"column": "Lương", "op": "range", "max": 800}, ["Bình", "Giang"]),
+        # Khoa để trống => nhận 1200 của Hà
+        ({"column": "Lương", "op": "range", "min": 1200, "max": 1200}, ["Hà", "Khoa"]),
+        ({"column": "Ngày vào", "op": "range", "min": "2024-01-01", "max": "2024-02-28"}, ["Dũng", "Em", "Hà", "Khoa"]),
+        ({"column": "Ngày vào", "op": "range", "min": "01/02/2024"}, ["Chi", "Em"]),
+    ],
+)
+def test_filter_ops(staff, tmp_path, condition, expected):
+    assert exported_names(staff, tmp_path, filters=[condition]) == expected
+
+
+def test_filters_are_combined_with_and(staff, tmp_path):
+    filters = [
+        {"column": "Phòng ban", "op": "equals", "value": "Kế toán"},
+        {"column": "Lương", "op": "range", "min": 1000},
+    ]
+    assert exported_names(staff, tmp_path, filters=filters) == ["Chi"]
+
+
+def test_no_match_raises(staff, tmp_path):
+    with pytest.raises(ExcelProcessorError, match="Không có bản ghi nào"):
+        exported_names(staff, tmp_path, filters=[{"column": "Phòng ban", "op": "equals", "value": "Không có"}])
+
+
+@pytest.mark.parametrize(
+    "descending, expected",
+    [
+        # Giá trị bằng nhau giữ thứ tự gốc (Hà/Khoa, Chi/Em), ô trống (An) luôn cuối
+        (False, ["Giang", "Bình", "Hà", "Khoa", "Chi", "Em", "Dũng", "An"]),
+        (True, ["Dũng", "Chi", "Em", "Hà", "Khoa", "Bình", "Giang", "An"]),
+    ],
+)
+def test_sort_is_stable_with_blanks_last(staff, tmp_path, descending, expected):
+    sort_by = {"column": "Lương", "descending": descending}
+    assert exported_names(staff, tmp_path, sort_by=sort_by) == expected
+
+
+def test_sort_by_date_and_text(staff, tmp_path):
+    assert exported_names(staff, tmp_path, sort_by={"column": "Ngày vào"}) == [
+        "Giang", "Bình", "Dũng", "Hà", "Khoa", "Em", "Chi", "An",
+    ]
+    # Sắp theo chuỗi sau ffill, không phân biệt hoa thường
+    assert exported_names(staff, tmp_path, sort_by={"column": "Phòng ban", "descending": True}) == [
+        "Giang", "Hà", "Khoa", "Dũng", "Em", "An", "Bình", "Chi",
+    ]
+
+
+@pytest.mark.parametrize(
+    "condition, message",
+    [
+        ({"column": "Lương", "op": "range"}, "cần min hoặc max"),
+        ({"column": "Ngày vào", "op": "range", "min": "abc"}, "Mốc ngày không hợp lệ"),
+        ({"column": "Lương", "op": "range", "min": 60, "max": "300"}, "cùng là số hoặc cùng là ngày"),
+        ({"column": "Lương", "op": "range", "min": True}, "phải là số hoặc ngày"),
+        ({"column": "Phòng ban", "op": "equals"}, "cần value"),
+        ({"column": "Phòng ban", "op": "contains", "value": " "}, "cần value"),
+        ({"column": "Phòng ban", "op": "in"}, "cần ít nhất 1 giá trị"),
+        ({"column": "Phòng ban", "op": "in", "values": []}, "cần ít nhất 1 giá trị"),
+    ],
+)
+def test_invalid_filter_rejected_with_400(app_module, condition, message):
+    client = TestClient(app_module.app)
+    response = client.post("/convert", json={
+        "filename": "khong_ton_tai.xlsx",
+        "sheet": "Data",
+        "columns": COLUMNS,
+        "header_row": 1,
+        "data_start_row": 2,
+        "filters": [condition],
+    })
+    # Bị chặn ngay khi parse request, trước cả bước kiểm tra file
+    assert response.status_code == 400
+    assert message in response.json()["detail"]
+
+
+def test_other_validation_errors_keep_422(app_module):
+    class Payload(BaseModel):
+        name: str
+
+        @field_validator("name")
+        @classmethod
+        def check_name(cls, name):
+            raise ValueError("tên không hợp lệ")
+
+    app = FastAPI()
+    app.add_exception_handler(RequestValidationError, app_module.validation_exception_handler)
+
+    @app.post("/echo")
+    async def echo(payload: Payload):
+        return payload
+
+    # value_error ngoài "filters" không bị đổi thành 400
+    response = TestClient(app).post("/echo", json={"name": "x"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "name"]
+
+
+def test_bool_range_bound_rejected_without_api():
+    # batch_convert đọc spec JSON thẳng vào validate_filter, true không được coi là số
+    with pytest.raises(ExcelProcessorError, match="phải là số hoặc ngày"):
+        validate_filter({"column": "Lương", "op": "range", "max": False})
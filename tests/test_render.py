@@ -0,0 +1,64 @@
+import zipfile
+
+import pytest
+
+import excel_processor
+from excel_processor import _new_document, _render_rows, convert_excel_to_docx
+
+COLUMNS = ["Tên", "Phòng ban", "Email"]
+
+
+def document_xml(path: str) -> bytes:
+    with zipfile.ZipFile(path) as z:
+        return z.read("word/document.xml")
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Ép chia nhiều khối và cho phép process pool với workbook nhỏ
+    monkeypatch.setattr(excel_processor, "RENDER_CHUNK_ROWS", 37)
+    monkeypatch.setattr(excel_processor, "PARALLEL_MIN_ROWS", 10)
+
+
+@pytest.mark.parametrize("workers", [2, 4])
+def test_parallel_matches_serial(workbook, tmp_path, small_chunks, workers):
+    serial = tmp_path / "serial.docx"
+    parallel = tmp_path / f"parallel_{workers}.docx"
+
+    assert convert_excel_to_docx(workbook, str(serial), "Data", COLUMNS, 1, 2, workers=1) == 300
+    assert convert_excel_to_docx(workbook, str(parallel), "Data", COLUMNS, 1, 2, workers=workers) == 300
+
+    assert document_xml(str(parallel)) == document_xml(str(serial))
+
+
+def test_chunked_matches_single_body(workbook, tmp_path, small_chunks):
+    output = tmp_path / "chunked.docx"
+    convert_excel_to_docx(workbook, str(output), "Data", COLUMNS, 1, 2, workers=1)
+
+    # Cách render cũ: toàn bộ dòng vào 1 body
+    rows = [
+        [f"Người {i}", f"Phòng {i // 5}", f"user{i}@example.com"]
+        for i in range(300)
+    ]
+    doc = _new_document()
+    _render_rows(doc, rows, COLUMNS, 0, len(rows))
+    reference = tmp_path / "reference.docx"
+    doc.save(str(reference))
+
+    assert document_xml(str(output)) == document_xml(str(reference))
+
+
+def test_separator_and_ffill(workbook, tmp_path, small_chunks):
+    from docx import Document
+
+    output = tmp_path / "out.docx"
+    convert_excel_to_docx(workbook, str(output), "Data", COLUMNS, 1, 2, workers=2)
+    paragraphs = Document(str(output)).paragraphs
+
+    # 300 bản ghi + 299 dòng phân cách, không có phân cách sau bản ghi cuối
+    assert len(paragraphs) == 599
+    assert paragraphs[1].text == "-" * 50
+    assert paragraphs[-1].text != "-" * 50
+    # Dòng 2 của nhóm đầu tiên được ffill "Phòng 0"
+    assert "Phòng ban: Phòng 0" in paragraphs[2].text
+    assert paragraphs[0].runs[0].bold and paragraphs[0].runs[0].text == "Tên: "
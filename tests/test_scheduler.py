@@ -0,0 +1,96 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from admission import (
+    JOB_BASE_BYTES,
+    READ_BYTES_PER_CELL,
+    RENDER_BYTES_PER_CELL,
+    MemoryBudget,
+    estimate_job_memory,
+    job_cells,
+)
+from scheduler import ConversionScheduler, estimate_job_cost
+
+HEAVY_JOBS = 20
+HEAVY_SECONDS = 0.2
+SMALL_USERS = 10
+SMALL_SECONDS = 0.005
+
+
+async def simulate(scheduler: ConversionScheduler) -> list[float]:
+    """User "heavy" gửi 20 job 200ms, ngay sau đó 10 user khác mỗi người gửi 1 job 5ms."""
+    heavy = [
+        asyncio.ensure_future(scheduler.submit("heavy", HEAVY_SECONDS * 1000, time.sleep, HEAVY_SECONDS))
+        for _ in range(HEAVY_JOBS)
+    ]
+    await asyncio.sleep(0.01)
+
+    async def small(user: str) -> float:
+        started = time.monotonic()
+        await scheduler.submit(user, SMALL_SECONDS * 1000, time.sleep, SMALL_SECONDS)
+        return time.monotonic() - started
+
+    latencies = await asyncio.gather(*(small(f"user{i}") for i in range(SMALL_USERS)))
+    await asyncio.gather(*heavy)
+    return latencies
+
+
+@pytest.mark.parametrize(
+    "max_concurrent, bound",
+    [
+        # 1 slot: job nhỏ chỉ phải chờ tối đa 1 job nặng đang chạy (FIFO sẽ là ~4s)
+        (1, HEAVY_SECONDS + SMALL_USERS * SMALL_SECONDS + 0.25),
+        # 2 slot, per_user_limit=1: user nặng chỉ giữ 1 slot, job nhỏ không phải chờ job nặng
+        (2, SMALL_USERS * SMALL_SECONDS + 0.25),
+    ],
+)
+def test_small_jobs_not_starved_by_heavy_user(max_concurrent, bound):
+    with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+        scheduler = ConversionScheduler(max_concurrent=max_concurrent, per_user_limit=1, executor=executor)
+        latencies = asyncio.run(simulate(scheduler))
+
+    assert max(latencies) < bound, latencies
+    stats = scheduler.stats()
+    assert stats["completed"] == HEAVY_JOBS + SMALL_USERS
+    assert stats["queue_depth"] == 0 and stats["running"] == 0
+
+
+def test_large_job_not_starved_by_smaller_jobs_that_fit():
+    """Job cần 80/100 RAM trong lúc các user khác liên tục gửi job 30/100 (luôn vừa chỗ trống)."""
+
+    async def scenario() -> float:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            scheduler = ConversionScheduler(
+                max_concurrent=4, per_user_limit=1, executor=executor, memory_budget=MemoryBudget(100)
+            )
+            jobs = [asyncio.ensure_future(scheduler.submit("u0", 1, time.sleep, 0.1, memory=30))]
+            await asyncio.sleep(0.01)
+
+            started = time.monotonic()
+            big = asyncio.ensure_future(scheduler.submit("big", 1, time.sleep, 0.05, memory=80))
+            big_latency = []
+            big.add_done_callback(lambda _: big_latency.append(time.monotonic() - started))
+            for i in range(1, 40):
+                jobs.append(asyncio.ensure_future(scheduler.submit(f"u{i}", 1, time.sleep, 0.1, memory=30)))
+                await asyncio.sleep(0.02)
+            await asyncio.gather(big, *jobs)
+            assert scheduler.memory_budget.reserved_bytes == 0
+            return big_latency[0]
+
+    # Nếu job nhỏ được chen lên, job lớn chỉ chạy khi dòng job nhỏ dừng (~0.8s)
+    assert asyncio.run(scenario()) < 0.5
+
+
+def test_cost_and_memory_use_same_cell_counts():
+    dims = (1000, 5, 3, 1, 2, 500)
+    read_cells, render_cells = job_cells(*dims)
+    assert (read_cells, render_cells) == (1000 * 5, 499 * 3)
+    assert estimate_job_cost(*dims) == read_cells + render_cells * 10
+    assert estimate_job_memory(*dims) == (
+        JOB_BASE_BYTES + read_cells * READ_BYTES_PER_CELL + render_cells * RENDER_BYTES_PER_CELL
+    )
+    # data_end_row vượt quá sheet => tính đến dòng cuối
+    assert job_cells(1000, 5, 3, 1, 2, 5000) == job_cells(1000, 5, 3, 1, 2, None)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+
+import httpx
+import itsdangerous
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from session_store import MemorySessionBackend, ServerSideSessionMiddleware, SQLiteSessionBackend
+
+
+def make_client(backend) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/state")
+    async def state(request: Request):
+        # Giống authlib lưu OAuth state trước khi đăng nhập
+        request.session["_state_google"] = {"data": "x"}
+        return {}
+
+    @app.get("/login")
+    async def login(request: Request):
+        request.session["user"] = {"sub": "1", "access_token": "t" * 2000}
+        return {}
+
+    @app.get("/whoami")
+    async def whoami(request: Request):
+        return {"user": request.session.get("user")}
+
+    @app.get("/logout")
+    async def logout(request: Request):
+        request.session.clear()
+        return {}
+
+    app.add_middleware(ServerSideSessionMiddleware, backend=backend, secret_key="test")
+    return TestClient(app)
+
+
+def test_cookie_holds_only_session_id():
+    client = make_client(MemorySessionBackend(ttl=60))
+    client.get("/login")
+    assert len(client.cookies["session"]) < 100
+    assert client.get("/whoami").json()["user"]["sub"] == "1"
+    # Session không đổi => không gửi lại Set-Cookie
+    assert "set-cookie" not in client.get("/whoami").headers
+
+
+def test_session_id_rotated_on_login():
+    backend = MemorySessionBackend(ttl=60)
+    client = make_client(backend)
+
+    client.get("/state")
+    pre_auth_cookie = client.cookies["session"]
+    assert len(backend._data) == 1
+
+    client.get("/login")
+    assert client.cookies["session"] != pre_auth_cookie
+    assert len(backend._data) == 1  # id cũ đã bị xóa
+
+    # Kẻ tấn công giữ cookie cũ không thấy user
+    attacker = make_client(backend)
+    attacker.cookies.set("session", pre_auth_cookie)
+    assert attacker.get("/whoami").json()["user"] is None
+
+
+def test_logout_deletes_session():
+    backend = MemorySessionBackend(ttl=60)
+    client = make_client(backend)
+    client.get("/login")
+    client.get("/logout")
+    assert not backend._data
+    assert client.get("/whoami").json()["user"] is None
+
+
+def test_sqlite_cleanup_removes_expired(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), ttl=60)
+    backend.set("live", "{}")
+    backend.set("expired", "{}")
+    with backend._connect() as conn:
+        conn.execute("UPDATE sessions SET expires_at = ? WHERE id = 'expired'", (time.time() - 1,))
+
+    backend.cleanup()
+
+    rows = backend._connect().execute("SELECT id FROM sessions").fetchall()
+    assert rows == [("live",)]
+
+
+def test_memory_cleanup_removes_expired():
+    backend = MemorySessionBackend(ttl=60)
+    backend.set("live", "{}")
+    backend._data["expired"] = (time.time() - 1, "{}")
+    backend.cleanup()
+    assert list(backend._data) == ["live"]
+
+
+def test_backend_ttl_slides_on_access(tmp_path):
+    memory = MemorySessionBackend(ttl=60)
+    memory.set("sid", "{}")
+    memory._data["sid"] = (time.time() + 1, "{}")
+    assert memory.get("sid") == "{}"
+    assert memory._data["sid"][0] > time.time() + 50
+
+    sqlite = SQLiteSessionBackend(str(tmp_path / "sessions.db"), ttl=60)
+    sqlite.set("sid", "{}")
+    with sqlite._connect() as conn:
+        conn.execute("UPDATE sessions SET expires_at = ? WHERE id = 'sid'", (time.time() + 1,))
+    assert sqlite.get("sid") == "{}"
+    (expires_at,) = sqlite._connect().execute("SELECT expires_at FROM sessions").fetchone()
+    assert expires_at > time.time() + 50
+
+
+def test_old_cookie_is_resigned():
+    class PastSigner(itsdangerous.TimestampSigner):
+        def get_timestamp(self) -> int:
+            return int(time.time()) - 8 * 24 * 3600
+
+    backend = MemorySessionBackend(ttl=14 * 24 * 3600)
+    backend.set("sid", json.dumps({"user": {"sub": "1"}}))
+    old_cookie = PastSigner("test").sign(b"sid").decode("utf-8")
+
+    response = make_client(backend).get("/whoami", cookies={"session": old_cookie})
+
+    # Quá nửa max_age (14 ngày) => cùng session id, chữ ký mới
+    assert response.json()["user"]["sub"] == "1"
+    new_cookie = response.cookies["session"]
+    assert new_cookie != old_cookie
+    assert itsdangerous.TimestampSigner("test").unsign(new_cookie, max_age=60) == b"sid"
+
+
+def test_backend_io_does_not_block_event_loop():
+    class SlowBackend(MemorySessionBackend):
+        def get(self, session_id):
+            time.sleep(0.3)
+            return super().get(session_id)
+
+    backend = SlowBackend(ttl=60)
+    backend.set("sid", json.dumps({"user": {"sub": "1"}}))
+    cookie = itsdangerous.TimestampSigner("test").sign(b"sid").decode("utf-8")
+    client = make_client(backend)
+    transport = httpx.ASGITransport(app=client.app)
+
+    async def scenario() -> float:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", cookies={"session": cookie}) as c:
+            started = time.monotonic()
+            await asyncio.gather(*(c.get("/whoami") for _ in range(4)))
+            return time.monotonic() - started
+
+    # 4 lần get() 0.3s chạy song song trong threadpool, không nối tiếp trên event loop
+    assert asyncio.run(scenario()) < 0.9
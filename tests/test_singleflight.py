@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from conftest import make_workbook
+from scheduler import ConversionScheduler
+from singleflight import SingleFlight
+
+N = 5
+
+
+async def cancel_and_wait(task: asyncio.Task) -> None:
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_job_survives_while_a_waiter_remains():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+            return "ok"
+
+        first = asyncio.ensure_future(flight.do(("g", 1), job))
+        second = asyncio.ensure_future(flight.do(("g", 1), job))
+        await asyncio.sleep(0)
+        await cancel_and_wait(first)
+
+        release.set()
+        assert await second == "ok"
+        assert flight.stats()["groups"]["g"] == {"executed": 1, "coalesced": 1}
+
+    asyncio.run(scenario())
+
+
+def test_last_waiter_leaving_removes_queued_job():
+    async def scenario():
+        blocker = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            scheduler = ConversionScheduler(max_concurrent=1, executor=executor)
+            flight = SingleFlight()
+
+            # Job khác giữ slot duy nhất => job coalesced nằm trong hàng đợi
+            running = asyncio.ensure_future(scheduler.submit("other", 1, blocker.wait))
+            try:
+                waiters = [
+                    asyncio.ensure_future(flight.do(("convert", 1), lambda: scheduler.submit("u", 1, time.sleep, 0)))
+                    for _ in range(2)
+                ]
+                await asyncio.sleep(0.05)
+                assert scheduler.stats()["queue_depth"] == 1
+
+                for waiter in waiters:
+                    await cancel_and_wait(waiter)
+                await asyncio.sleep(0)
+
+                assert scheduler.stats()["queue_depth"] == 0
+                assert flight.stats()["in_flight"] == 0
+            finally:
+                blocker.set()
+                await running
+
+    asyncio.run(scenario())
+
+
+# ---------- Qua ASGI: N request trùng nhau cùng lúc ----------
+
+@pytest.fixture
+def app(app_module, monkeypatch, tmp_path):
+    # Coalescer mới cho mỗi test; convert chạy trong thread để làm chậm được hàm bên trong
+    executor = ThreadPoolExecutor(max_workers=2)
+    # Thư mục upload/output riêng => đếm được đúng file test này tạo ra
+    for name in ("UPLOAD_FOLDER", "OUTPUT_FOLDER"):
+        folder = tmp_path / name.lower()
+        folder.mkdir()
+        monkeypatch.setattr(app_module, name, str(folder))
+    monkeypatch.setattr(app_module, "request_coalescer", SingleFlight())
+    monkeypatch.setattr(app_module, "conversion_scheduler", ConversionScheduler(executor=executor))
+
+    # Làm chậm phần việc dùng chung để mọi request trùng đều tới kịp lúc job còn chạy
+    for name in ("preview_sheet_data", "get_column_headers", "convert_excel_to_docx"):
+        real = getattr(app_module, name)
+
+        def slow(*args, _real=real, **kwargs):
+            time.sleep(0.3)
+            return _real(*args, **kwargs)
+
+        monkeypatch.setattr(app_module, name, slow)
+    yield app_module
+    executor.shutdown(wait=True)
+
+
+async def upload(client: httpx.AsyncClient, path: str) -> str:
+    with open(path, "rb") as f:
+        response = await client.post("/upload", files={"file": ("data.xlsx", f.read())})
+    assert response.status_code == 200, response.text
+    return response.json()["filename"]
+
+
+@pytest.mark.parametrize(
+    "endpoint, payload",
+    [
+        ("/preview", {"sheet": "Data", "num_rows": 10}),
+        ("/get-columns", {"sheet": "Data", "header_row": 1}),
+        ("/convert", {"sheet": "Data", "columns": ["Tên", "Phòng ban"], "header_row": 1, "data_start_row": 2}),
+    ],
+)
+def test_duplicate_requests_are_coalesced(app, tmp_path, endpoint, payload):
+    workbook = make_workbook(str(tmp_path / "data.xlsx"), rows=50)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            filename = await upload(client, workbook)
+            return await asyncio.gather(*(
+                client.post(endpoint, json={"filename": filename, **payload}) for _ in range(N)
+            ))
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * N, [r.text for r in responses]
+    bodies = [r.json() for r in responses]
+    assert all(body == bodies[0] for body in bodies)
+
+    group = endpoint.lstrip("/")
+    assert app.request_coalescer.stats()["groups"][group] == {"executed": 1, "coalesced": N - 1}
+    if endpoint == "/convert":
+        assert bodies[0]["row_count"] == 50
+        assert os.listdir(app.OUTPUT_FOLDER) == [bodies[0]["output_file"]]